@@ -2,154 +2,1031 @@
 :Authors: cykooz
 :Date: 03.12.2021
 """
-import glob
+import hashlib
+import json
 import logging
+import os
 from pathlib import Path
-from xml.etree import ElementTree
-from xml.sax.saxutils import escape
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
 
-import zc.recipe.egg
+from zc.buildout import UserError
 from zc.buildout.buildout import bool_option
 
+from .cost import BUDGET_ACTIONS, BUDGET_FAIL
+from .emitters import Emitter, create_emitters
+from .farm import SymlinkFarm
+from .iml import (
+    LEVEL_APPLICATION,
+    LibraryRef,
+    patch_application_libraries,
+    patch_module,
+)
+from .library import (
+    APPLICATION_LIBRARIES_PATH,
+    COLD_LIBRARY_NAME,
+    DEFAULT_EXCLUDE,
+    LIBRARY_NAME,
+    OVERLAP_KEEP,
+    OVERLAP_MODES,
+    SPLIT_IMPORTS,
+    SPLIT_MODES,
+    SPLIT_NONE,
+    find_ide_config_dirs,
+    get_application_library_name,
+    get_library_file_name,
+    is_own_library,
+    render_library,
+    remove_overlapping_entries,
+    render_library_element,
+    split_entries,
+)
+from .metrics import Metrics
+from .snapshot import FsSnapshot, normalize_project_name
+from .unzip import UnzippedEggsCache, get_default_cache_dir, parse_size
+from .utils import map_concurrently, write_if_changed
+
+if TYPE_CHECKING:
+    from .resolution import Resolution
+
+# Modules that are slow to import (zc.recipe.egg, pkg_resources,
+# ElementTree, etc.) are imported only when they are needed, because
+# in most of runs on CI servers the Idea project is absent and
+# the recipe does nothing.
+
+
+DEVELOP = 'develop'
+EGGS = 'eggs'
+OTHER = 'other'
+EXTRA = 'extra'
+STUBS = 'stubs'
+
+RESOLVER_BUILDOUT = 'buildout'
+RESOLVER_PINS = 'pins'
+RESOLVERS = (RESOLVER_BUILDOUT, RESOLVER_PINS)
+
+# Options of "buildout" section that are recorded into options of the part
+INSTALLED_DIRS = (
+    'bin-directory',
+    'develop-eggs-directory',
+    'eggs-directory',
+    'parts-directory',
+)
+
+
+# Tuple (category, canonical path, project name) of a distribution
+# of the working set.
+ClassifiedDist = Tuple[str, str, str]
+
+
+class PathEntry(NamedTuple):
+    category: str
+    path: Path
+
+
+class IdeaTarget(NamedTuple):
+    idea_dir: Path
+    result_path: Path
+    iml_paths: List[Path]
+
 
 class Recipe:
 
     def __init__(self, buildout, name, options):
         self.name = name
         self.buildout = buildout
-        self.idea_dir = Path(
-            options.get('idea_dir') or f'{buildout["buildout"]["directory"]}/.idea'
-        )
-        self.result_path = self.idea_dir / 'libraries' / 'Buildout_Eggs.xml'
+        idea_dirs = options.get('idea_dir') or f'{buildout["buildout"]["directory"]}/.idea'
+        self.idea_dirs = [
+            Path(line.strip()) for line in idea_dirs.splitlines() if line.strip()
+        ]
+        self.idea_dir = self.idea_dirs[0]
+        self.result_path = self._get_result_path(self.idea_dir)
         self.include_develop = bool_option(options, 'include_develop', False)
         self.include_eggs = bool_option(options, 'include_eggs', True)
         self.include_other = bool_option(options, 'include_other', False)
+        self.part_dir = Path(buildout['buildout']['parts-directory']) / name
+        self.fingerprint_path = self.part_dir / 'fingerprint'
+        self.resolution_cache = bool_option(options, 'resolution_cache', False)
+        self.resolution_cache_path = self.part_dir / 'resolution.json'
+        self.resolver = options.get('resolver', RESOLVER_BUILDOUT)
+        if self.resolver not in RESOLVERS:
+            raise UserError(
+                f'Invalid value of option "resolver": {self.resolver}. '
+                f'Possible values: {", ".join(RESOLVERS)}.'
+            )
+        self.split_libraries = options.get('split_libraries', SPLIT_NONE)
+        if self.split_libraries not in SPLIT_MODES:
+            raise UserError(
+                f'Invalid value of option "split_libraries": {self.split_libraries}. '
+                f'Possible values: {", ".join(SPLIT_MODES)}.'
+            )
+        self.split_buckets = _get_optional_int(options, 'split_buckets', min_value=1) or 8
+        self.omit_cold_library = bool_option(options, 'omit_cold_library', False)
+        self.imports_cache_path = self.part_dir / 'imports.json'
+        self.overlapping_roots = options.get('overlapping_roots', OVERLAP_KEEP)
+        if self.overlapping_roots not in OVERLAP_MODES:
+            raise UserError(
+                f'Invalid value of option "overlapping_roots": {self.overlapping_roots}. '
+                f'Possible values: {", ".join(OVERLAP_MODES)}.'
+            )
+        exclude = options.get('exclude')
+        self.exclude = DEFAULT_EXCLUDE if exclude is None else exclude.split()
+        self.application_library = bool_option(options, 'application_library', False)
+        self.idea_config_dirs = [
+            Path(line.strip()).expanduser()
+            for line in options.get('idea_config_dir', '').splitlines()
+            if line.strip()
+        ]
+        self.symlink_farm = bool_option(options, 'symlink_farm', False)
+        self.site_dir = self.part_dir / 'site'
+        self.unzip_eggs = bool_option(options, 'unzip_eggs', False)
+        self.library_registry_path = (
+            get_default_cache_dir('libraries') / 'registry.json'
+        )
+        self.unzip_cache_dir = Path(
+            options.get('unzip_cache_dir') or get_default_cache_dir()
+        ).expanduser()
+        try:
+            self.unzip_cache_size = parse_size(options.get('unzip_cache_size', '5G'))
+        except ValueError as e:
+            raise UserError(f'Invalid value of option "unzip_cache_size": {e}')
+        self.binary_stubs = bool_option(options, 'binary_stubs', False)
+        self.stubs_cache_dir = Path(
+            options.get('stubs_cache_dir') or get_default_cache_dir('stubs')
+        ).expanduser()
+        self.cost_report = bool_option(options, 'cost_report', False)
+        self.cost_report_path = self.part_dir / 'cost.json'
+        self.cost_cache_path = self.part_dir / 'cost_cache.json'
+        self.max_roots = _get_optional_int(options, 'max_roots')
+        self.max_files = _get_optional_int(options, 'max_files')
+        max_bytes = options.get('max_bytes')
+        try:
+            self.max_bytes = parse_size(max_bytes) if max_bytes else None
+        except ValueError as e:
+            raise UserError(f'Invalid value of option "max_bytes": {e}')
+        self.budget_action = options.get('budget_action', 'warn')
+        if self.budget_action not in BUDGET_ACTIONS:
+            raise UserError(
+                f'Invalid value of option "budget_action": {self.budget_action}. '
+                f'Possible values: {", ".join(BUDGET_ACTIONS)}.'
+            )
+        self.metrics_enabled = bool_option(options, 'metrics', True)
+        self.metrics_path = self.part_dir / 'metrics.json'
+        self.metrics_prometheus = bool_option(options, 'metrics_prometheus', False)
+        self.metrics_prometheus_path = self.part_dir / 'metrics.prom'
+        self.profile = bool_option(options, 'profile', False)
+        self.profile_path = self.part_dir / 'profile.pstats'
+        self.metrics = Metrics()
+        self.emitters = create_emitters(self, options)
         _ = options['eggs']  # Mute warning about unused option 'eggs'
+        self._options = sorted(
+            (key, value) for key, value in options.copy().items()
+            if key not in INSTALLED_DIRS
+        )
+        # Directories are recorded into ".installed.cfg" to allow
+        # regenerating of libraries without buildout (see "idea_sync").
+        for key in INSTALLED_DIRS:
+            options[key] = buildout['buildout'][key]
+        self._eggs_options = options
+        self._eggs_instance = None
+        self._library_name = LIBRARY_NAME
+        self._snapshot = None
+
+    @property
+    def _eggs(self):
+        """Instance of ``zc.recipe.egg.Scripts`` that is created on first use."""
+        if self._eggs_instance is None:
+            with self.metrics.phase('scripts'):
+                self._eggs_instance = self._create_eggs(self._eggs_options)
+        return self._eggs_instance
+
+    def _create_eggs(self, options):
+        import zc.recipe.egg
         options = options.copy()
         options['relative-paths'] = 'false'
-        self._eggs = zc.recipe.egg.Scripts(buildout, name, options)
-        self._library_name = 'Buildout Eggs'
+        return zc.recipe.egg.Scripts(self.buildout, self.name, options)
+
+    @property
+    def snapshot(self) -> FsSnapshot:
+        if self._snapshot is None:
+            self._snapshot = FsSnapshot()
+        return self._snapshot
 
     def install(self):
-        if not self.idea_dir.is_dir():
-            logging.getLogger(self.name).debug(
-                f'Directory of an Idea project ({self.idea_dir}) has not found.'
-            )
+        if not self.profile:
+            self._install()
             return ()
-        iml_paths = list(self.idea_dir.glob('*.iml'))
-        if not iml_paths:
-            logging.getLogger(self.name).debug(
-                f'Module files (.iml) has not found inside of directory of Idea project.'
+
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(self._install)
+        finally:
+            self.part_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(self.profile_path)
+        return ()
+
+    def _install(self):
+        self._snapshot = FsSnapshot()
+        targets = self._get_targets()
+        if not self._get_active_emitters(targets):
+            return
+        with self.metrics.phase('fingerprint'):
+            fingerprint = self._get_fingerprint(targets)
+        if fingerprint == self._read_fingerprint():
+            logging.getLogger(self.name).info(
+                'Options, pinned versions, develop eggs and eggs directory '
+                'have not changed since the last run. Skipped.'
             )
-            return ()
+            self.metrics.skipped = True
+            self._save_metrics()
+            return
 
-        self._write_paths()
-        self._update_idea_project(iml_paths[0])
+        self._update_targets(targets)
 
-        return ()
+        # Resolving of the working set could install new eggs,
+        # so the fingerprint must be calculated again.
+        self.snapshot.invalidate()
+        with self.metrics.phase('fingerprint'):
+            self._save_fingerprint(self._get_fingerprint(targets))
+        self._save_metrics()
+
+    def _get_active_emitters(self, targets: List['IdeaTarget']) -> List[Emitter]:
+        return [emitter for emitter in self.emitters if emitter.is_active(targets)]
+
+    def _update_targets(self, targets: List['IdeaTarget'],
+                        entries: List[Tuple[str, Path, Optional[str]]] = None):
+        """Collects library entries once and passes them to all emitters
+        that have something to write (e.g. writes library tables and adds
+        them into modules of given Idea projects). ``entries`` are entries
+        returned by ``_iter_entries()`` if they are already collected.
+        """
+        emitters = self._get_active_emitters(targets)
+        entries = list(self._iter_library_entries(entries))
+        for category, _, _ in entries:
+            self.metrics.add_root(category)
+        map_concurrently(lambda emitter: emitter.emit(entries, targets), emitters)
+
+    def _save_metrics(self):
+        """Saves the report about the current run and starts
+        collecting of metrics of the next run.
+        """
+        metrics, self.metrics = self.metrics, Metrics()
+        logging.getLogger(self.name).debug(f'Run has taken {metrics.get_summary()}.')
+        if not self.metrics_enabled:
+            return
+        self.part_dir.mkdir(parents=True, exist_ok=True)
+        metrics.save(
+            self.name,
+            self.metrics_path,
+            self.metrics_prometheus_path if self.metrics_prometheus else None,
+        )
 
     update = install
 
-    def get_paths(self):
-        requirements, ws = self._eggs.working_set()
-        buildout_cfg = self.buildout['buildout']
+    def _get_targets(self) -> List['IdeaTarget']:
+        """Returns Idea projects that exist and have module files."""
+        logger = logging.getLogger(self.name)
+        targets = []
+        for idea_dir in self.idea_dirs:
+            if not self.snapshot.is_dir(idea_dir):
+                logger.debug(
+                    f'Directory of an Idea project ({idea_dir}) has not found.'
+                )
+                continue
+            iml_paths = self._get_module_paths(idea_dir)
+            if not iml_paths:
+                logger.debug(
+                    f'Module files (.iml) has not found for Idea project ({idea_dir}).'
+                )
+                continue
+            targets.append(
+                IdeaTarget(idea_dir, self._get_result_path(idea_dir), iml_paths)
+            )
+        return targets
+
+    def _get_module_paths(self, idea_dir: Path) -> List[Path]:
+        """Returns paths of existing module files listed in ``modules.xml``.
+        If the project has not this file, then all ``.iml`` files inside
+        of the project directory are returned.
+        """
+        modules_path = idea_dir / 'modules.xml'
+        paths = []
+        if self.snapshot.exists(modules_path):
+            project_dir = idea_dir.parent.as_posix()
+            from xml.etree import ElementTree
+            try:
+                modules_xml = ElementTree.parse(modules_path)
+            except ElementTree.ParseError as e:
+                logging.getLogger(self.name).warning(
+                    f'File {modules_path} is not valid XML: {e}'
+                )
+            else:
+                for module in modules_xml.iter('module'):
+                    file_path = module.get('filepath')
+                    if not file_path:
+                        continue
+                    path = Path(file_path.replace('$PROJECT_DIR$', project_dir))
+                    if path not in paths and self.snapshot.exists(path):
+                        paths.append(path)
+        if not paths:
+            paths = [Path(p) for p in self.snapshot.glob(idea_dir, '*.iml')]
+        return paths
+
+    @staticmethod
+    def _get_result_path(idea_dir: Path) -> Path:
+        return idea_dir / 'libraries' / 'Buildout_Eggs.xml'
 
-        all_develop_paths = set()
-        egg_link_dir = Path(buildout_cfg['develop-eggs-directory'])
-        for egg_link in egg_link_dir.glob('*.egg-link'):
-            with egg_link.open('rt') as f:
-                path = f.readline().strip()
-                if path:
-                    all_develop_paths.add(Path(path))
-
-        egg_directory = Path(buildout_cfg['eggs-directory'])
-        develop_paths = []
-        egg_paths = []
-        other_paths = []
-        for dist in ws:
-            path = Path(dist.location)
-            if path in all_develop_paths:
-                if self.include_develop:
-                    develop_paths.append(path)
-            elif egg_directory in path.parents:
-                if self.include_eggs:
-                    egg_paths.append(path)
-            elif self.include_other:
-                other_paths.append(path)
+    def _get_inputs_digest(self) -> str:
+        """Returns a cheap digest of everything that may affect
+        the list of paths - options of the part, pinned versions,
+        metadata of develop eggs, list of installed eggs and extra paths
+        matched with glob patterns.
+        """
+        from zc.buildout.easy_install import default_versions
+        from .metadata import get_develop_eggs_state
+        buildout_cfg = self.buildout['buildout']
+        develop_eggs_dir = buildout_cfg['develop-eggs-directory']
+        eggs_dir = buildout_cfg['eggs-directory']
+        snapshot = self.snapshot
+        inputs = {
+            'options': self._options,
+            'find-links': buildout_cfg.get('find-links', ''),
+            'index': buildout_cfg.get('index', ''),
+            'versions': sorted(default_versions().items()),
+            'develop-eggs': get_develop_eggs_state(snapshot, develop_eggs_dir),
+            'eggs': sorted(snapshot.listdir(eggs_dir)),
+            'extra-paths': sorted(self._expand_extra_paths()),
+        }
+        data = json.dumps(inputs, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
 
+    def _get_fingerprint(self, targets: List[IdeaTarget]) -> str:
+        """Returns fingerprint of inputs and current state of output files.
+        Output files are included to regenerate them if they were
+        changed or removed by somebody else.
+        """
+        snapshot = self.snapshot
         paths = [
-            *develop_paths,
-            *egg_paths,
-            *other_paths,
+            str(path)
+            for emitter in self._get_active_emitters(targets)
+            for path in emitter.get_output_paths(targets)
         ]
-        for path in self._eggs.extra_paths:
-            if '*' in path:
-                paths += [Path(p) for p in glob.glob(path)]
+        if self.symlink_farm:
+            paths.append(str(self.site_dir))
+        if self.application_library:
+            paths.extend(
+                str(config_dir / APPLICATION_LIBRARIES_PATH)
+                for config_dir in self._get_idea_config_dirs()
+            )
+        outputs = []
+        if self.unzip_eggs:
+            # Unpacked eggs may be evicted from the shared cache
+            # by other buildouts.
+            outputs = [
+                (path, os.path.isdir(path))
+                for path in self._get_unzipped_cache().get_cached_dirs()
+            ]
+        if self.binary_stubs:
+            # Stubs may be removed from the shared cache by somebody else
+            outputs.extend(
+                (path, os.path.isdir(path))
+                for path in self._get_stubs_cache().get_cached_dirs()
+            )
+        outputs.extend(
+            (path, snapshot.get_mtime(path), snapshot.get_size(path))
+            for path in sorted(set(paths))
+        )
+        data = json.dumps([self._get_inputs_digest(), outputs]).encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
+
+    def _read_fingerprint(self):
+        try:
+            return self.fingerprint_path.read_text().strip()
+        except OSError:
+            return None
+
+    def _save_fingerprint(self, fingerprint: str):
+        self.part_dir.mkdir(parents=True, exist_ok=True)
+        self.fingerprint_path.write_text(fingerprint)
+
+    def get_paths(self) -> List[Path]:
+        return [path for _, path in self.iter_paths()]
+
+    def iter_paths(self) -> Iterator[PathEntry]:
+        """Yields unique paths with their categories (``develop``, ``eggs``,
+        ``other`` or ``extra``) in the order of the library table.
+        """
+        for category, path, _ in self._iter_entries():
+            yield PathEntry(category, path)
+
+    def _iter_entries(
+            self,
+            classified: List[ClassifiedDist] = None,
+            extra_paths: List[str] = None,
+    ) -> Iterator[Tuple[str, Path, Optional[str]]]:
+        """Yields tuples ``(category, path, project name)``.
+        Project name is ``None`` for extra paths. ``classified`` and
+        ``extra_paths`` are results of ``_classify_working_set()`` and
+        ``_expand_extra_path()`` (with canonical paths) if they are
+        already collected.
+        """
+        entries = self._iter_unique_entries(classified, extra_paths)
+        if self.overlapping_roots == OVERLAP_KEEP:
+            yield from entries
+            return
+
+        entries = list(entries)
+        with self.metrics.phase('overlap'):
+            kept = remove_overlapping_entries(entries, self.overlapping_roots)
+        removed = len(entries) - len(kept)
+        if removed:
+            self.metrics.add_removed_roots(removed)
+            logging.getLogger(self.name).info(
+                f'{removed} roots overlapping with other roots have removed.'
+            )
+        yield from kept
+
+    def _iter_unique_entries(
+            self,
+            classified: List[ClassifiedDist] = None,
+            extra_paths: List[str] = None,
+    ) -> Iterator[Tuple[str, Path, Optional[str]]]:
+        """Yields entries with canonical paths (absolute and without
+        symbolic links). Aliases of the same directory are yielded once.
+        """
+        if classified is None:
+            classified = self._classify_working_set()
+        included = {
+            DEVELOP: self.include_develop,
+            EGGS: self.include_eggs,
+            OTHER: self.include_other,
+        }
+        unique_paths = _OrderedPathSet()
+        aliases = 0
+        # Stable sorting by categories keeps the order
+        # of the working set (sys.path) inside of categories.
+        order = {DEVELOP: 0, EGGS: 1, OTHER: 2}
+        for category, path, project_name in sorted(
+            classified, key=lambda item: order[item[0]]
+        ):
+            if not included[category]:
+                continue
+            if unique_paths.add(path):
+                yield category, Path(path), project_name
             else:
-                paths.append(Path(path))
+                aliases += 1
 
-        # order preserving unique
-        unique_paths = []
-        for p in paths:
-            if p not in unique_paths:
-                unique_paths.append(p)
+        if extra_paths is None:
+            with self.metrics.phase('extra_paths'):
+                extra_paths = [
+                    self.snapshot.realpath(path)
+                    for pattern in self._get_extra_paths()
+                    for path in self._expand_extra_path(pattern)
+                ]
+        for path in extra_paths:
+            if unique_paths.add(path):
+                yield EXTRA, Path(path), None
+            else:
+                aliases += 1
+        if aliases:
+            self.metrics.add_removed_roots(aliases)
 
-        return unique_paths
+    def _classify_working_set(self) -> List[ClassifiedDist]:
+        """Returns tuples ``(category, canonical path, project name)``
+        for all distributions of the working set in its order.
+        """
+        with self.metrics.phase('resolve'):
+            ws = self._resolve()
+        snapshot = self.snapshot
+        egg_dir_prefix = os.path.join(
+            snapshot.realpath(self.buildout['buildout']['eggs-directory']), ''
+        )
+        classified = []
+        with self.metrics.phase('classify'):
+            for dist in ws:
+                path = snapshot.realpath(dist.location)
+                # Dists outside of eggs directory are develop or other ones
+                category = EGGS if path.startswith(egg_dir_prefix) else OTHER
+                classified.append((category, path, dist.project_name))
+        return self._reclassify_develop(classified)
 
-    def _write_paths(self):
-        lines = [
-            f'<component name="libraryTable">',
-            f'  <library name="{self._library_name}" type="python">',
-            f'    <CLASSES>',
+    def _reclassify_develop(self, classified: List[ClassifiedDist],
+                            project_names: Set[str] = None) -> List[ClassifiedDist]:
+        """Returns the list with updated categories of distributions
+        outside of eggs directory - develop or other ones. Only given
+        projects (normalized names) are checked if ``project_names``
+        is not ``None``, only their egg-links are read.
+        """
+        if not (self.include_develop or self.include_other):
+            return classified
+        outside = [
+            i for i, (category, _, project_name) in enumerate(classified)
+            if category != EGGS and (
+                project_names is None
+                or normalize_project_name(project_name) in project_names
+            )
         ]
-        for path in self.get_paths():
-            lines.append(
-                f'      <root url="file://{escape(path.as_posix())}" />'
+        if not outside:
+            return classified
+        with self.metrics.phase('egg_links'):
+            develop_paths = self._get_develop_paths(
+                classified[i][2] for i in outside
             )
-        lines.extend((
-            '    </CLASSES>',
-            '    <JAVADOC />',
-            '    <SOURCES />',
-            '  </library>',
-            '</component>',
-            '',
-        ))
-
-        result_dir = self.idea_dir / 'libraries'
-        if not result_dir.exists():
-            result_dir.mkdir(exist_ok=True)
-
-        with self.result_path.open('wt') as f:
-            f.write('\n'.join(lines))
-        logging.getLogger(self.name).debug(
-            f'The library table with list of eggs paths has created in the file "{self.result_path}".'
-        )
-
-    def _update_idea_project(self, iml_path: Path):
-        iml_data = iml_path.read_text()
-        if f'name="{self._library_name}"' not in iml_data:
-            iml_xml = ElementTree.fromstring(iml_data)
-            element = iml_xml.find('component[@name="NewModuleRootManager"]')
-            if element:
-                last_tail = element[-1].tail
-                element[-1].tail = '\n    '
-                order_entry = ElementTree.Element(
-                    'orderEntry',
-                    attrib={
-                        'type': 'library',
-                        'name': self._library_name,
-                        'level': 'project',
-                    },
+        classified = list(classified)
+        for i in outside:
+            _, path, project_name = classified[i]
+            category = DEVELOP if path in develop_paths else OTHER
+            classified[i] = (category, path, project_name)
+        return classified
+
+    def _resolve(self) -> 'Resolution':
+        from .resolution import resolve
+        return resolve(
+            self._eggs,
+            logging.getLogger(self.name),
+            cache_path=self.resolution_cache_path if self.resolution_cache else None,
+            snapshot=self.snapshot,
+            by_pins=self.resolver == RESOLVER_PINS,
+        )
+
+    def _get_extra_paths(self) -> List[str]:
+        return self._eggs.extra_paths
+
+    def _expand_extra_paths(self) -> List[str]:
+        """Returns extra paths joined with the buildout directory
+        and with expanded glob patterns.
+        """
+        return [
+            path
+            for pattern in self._get_extra_paths()
+            for path in self._expand_extra_path(pattern)
+        ]
+
+    def _expand_extra_path(self, pattern: str) -> List[str]:
+        """Returns paths matched with one extra path."""
+        import glob
+        path = os.path.join(self.buildout['buildout']['directory'], pattern)
+        if '*' in path:
+            return sorted(glob.glob(path))
+        return [path]
+
+    def _get_develop_paths(self, project_names: Iterable[str]) -> Set[str]:
+        """Returns paths of develop eggs of given projects.
+        Only egg-links of these projects are read, other ones can't
+        affect the result.
+        """
+        develop_eggs_dir = self.buildout['buildout']['develop-eggs-directory']
+        egg_links = self.snapshot.get_egg_links(develop_eggs_dir)
+        link_paths = [
+            egg_links[key]
+            for key in map(normalize_project_name, project_names)
+            if key in egg_links
+        ]
+        targets = self.snapshot.read_egg_links(link_paths)
+        return {self.snapshot.realpath(targets[p]) for p in link_paths if targets[p]}
+
+    def _write_paths(self, idea_dirs=None, entries=None) -> List[LibraryRef]:
+        """Writes library tables with given entries (by default - entries
+        of the working set) into given Idea projects (by default - into
+        all Idea projects). Removes library tables that were created
+        by previous runs and are not used now.
+
+        Returns references to written libraries.
+        """
+        if idea_dirs is None:
+            idea_dirs = self.idea_dirs
+        if entries is None:
+            entries = list(self._iter_library_entries())
+        shared_entries = []
+        if self.application_library:
+            own_entries = []
+            for entry in entries:
+                if self._is_shared_entry(entry):
+                    shared_entries.append(entry)
+                else:
+                    own_entries.append(entry)
+            entries = own_entries
+        hot_projects = None
+        if self.split_libraries == SPLIT_IMPORTS:
+            with self.metrics.phase('imports'):
+                hot_projects = self._get_hot_projects()
+        libraries = split_entries(
+            entries, self.split_libraries, self.split_buckets, hot_projects
+        )
+        if self.split_libraries == SPLIT_IMPORTS and self.omit_cold_library:
+            libraries.pop(COLD_LIBRARY_NAME, None)
+        libraries = {
+            name: entries for name, entries in libraries.items()
+            if entries or (
+                self.split_libraries == SPLIT_NONE and not self.application_library
+            )
+        }
+        with self.metrics.phase('exclude'):
+            excluded_paths = {
+                name: self._get_excluded_paths(entries)
+                for name, entries in libraries.items()
+            }
+            shared_excluded_paths = self._get_excluded_paths(shared_entries)
+        if self.cost_report or self._has_budget():
+            with self.metrics.phase('cost'):
+                self._check_cost(
+                    [
+                        (category, path)
+                        for entries in [*libraries.values(), shared_entries]
+                        for category, path, _ in entries
+                    ],
+                    [
+                        path
+                        for paths in [*excluded_paths.values(), shared_excluded_paths]
+                        for path in paths
+                    ],
+                )
+        with self.metrics.phase('render'):
+            files = {
+                get_library_file_name(name): render_library(
+                    name,
+                    [path for _, path, _ in entries],
+                    excluded_paths[name],
+                )
+                for name, entries in libraries.items()
+            }
+        logger = logging.getLogger(self.name)
+
+        def write(idea_dir: Path):
+            libraries_dir = idea_dir / 'libraries'
+            for file_name, data in files.items():
+                result_path = libraries_dir / file_name
+                written = write_if_changed(result_path, data)
+                self.metrics.add_write(result_path, len(data), written)
+                if written:
+                    logger.debug(
+                        f'The library table with list of eggs paths has created in the file "{result_path}".'
+                    )
+                else:
+                    logger.debug(
+                        f'The library table in the file "{result_path}" is up to date.'
+                    )
+            for path in self._get_library_files(idea_dir):
+                if os.path.basename(path) not in files:
+                    os.unlink(path)
+                    logger.debug(f'Unused library table "{path}" has removed.')
+
+        with self.metrics.phase('write'):
+            map_concurrently(write, idea_dirs)
+        refs = [
+            LibraryRef(name) for name in libraries
+            if get_library_file_name(name) in files
+        ]
+        if shared_entries:
+            shared_paths = [path for _, path, _ in shared_entries]
+            name = get_application_library_name(shared_paths, shared_excluded_paths)
+            with self.metrics.phase('write'):
+                self._write_application_library(
+                    name, shared_paths, shared_excluded_paths
                 )
-                order_entry.tail = last_tail
-                element.append(order_entry)
-                iml_data = ElementTree.tostring(
-                    iml_xml,
-                    encoding='utf-8',
+            refs.append(LibraryRef(name, LEVEL_APPLICATION))
+        elif self.application_library:
+            # Forget the library used by the previous run
+            with self.metrics.phase('write'):
+                self._write_application_library(None, [], [])
+        return refs
+
+    def _has_budget(self) -> bool:
+        return any(
+            limit is not None
+            for limit in (self.max_roots, self.max_files, self.max_bytes)
+        )
+
+    def _check_cost(self, entries: List[Tuple[str, Path]],
+                    excluded_paths: List[Path]):
+        """Writes the report about the cost of indexing of library roots
+        and checks the budget of indexing.
+        """
+        from .cost import CostEstimator, check_budget, get_totals, render_report
+        logger = logging.getLogger(self.name)
+        estimator = CostEstimator(
+            self.cost_cache_path,
+            [
+                self.snapshot.realpath(self.buildout['buildout']['eggs-directory']),
+                str(self.unzip_cache_dir),
+            ],
+            self.exclude,
+        )
+        costs = estimator.estimate(entries, excluded_paths)
+        self.part_dir.mkdir(parents=True, exist_ok=True)
+        write_if_changed(self.cost_report_path, render_report(costs))
+        totals = get_totals(costs)
+        logger.debug(
+            f'Libraries have {totals["roots"]} roots with {totals["files"]} files '
+            f'({totals["py_files"]} Python files, {totals["size"]} bytes).'
+        )
+        errors = check_budget(costs, self.max_roots, self.max_files, self.max_bytes)
+        if not errors:
+            return
+        message = 'Indexing budget is exceeded: ' + '; '.join(errors) + '.'
+        if self.budget_action == BUDGET_FAIL:
+            raise UserError(message)
+        logger.warning(message)
+
+    def _get_hot_projects(self) -> Set[str]:
+        """Returns normalized names of develop projects, projects imported
+        by sources of develop projects and their requirements.
+        """
+        from .imports import ImportsCache, get_hot_projects
+        ws = self._resolve()
+        snapshot = self.snapshot
+        develop_paths = self._get_develop_paths(dist.project_name for dist in ws)
+        buildout_cfg = self.buildout['buildout']
+        self.part_dir.mkdir(parents=True, exist_ok=True)
+        imported_names = ImportsCache(
+            self.imports_cache_path, logging.getLogger(self.name)
+        ).get_imported_names(
+            sorted(develop_paths),
+            self.exclude,
+            skip_dirs=[snapshot.realpath(buildout_cfg[key]) for key in INSTALLED_DIRS],
+        )
+        hot = get_hot_projects(
+            imported_names,
+            [(dist.project_name, dist.location) for dist in ws],
+        )
+        hot.update(
+            normalize_project_name(dist.project_name) for dist in ws
+            if snapshot.realpath(dist.location) in develop_paths
+        )
+        logging.getLogger(self.name).debug(
+            f'{len(hot)} of {len(ws)} distributions are used by develop projects.'
+        )
+        return hot
+
+    def _is_shared_entry(self, entry) -> bool:
+        """Returns ``True`` if the entry is the same for all buildouts
+        that use the same versions of eggs. The symlink farm is placed
+        inside of the part directory, so it is project-specific.
+        """
+        category, path, _ = entry
+        return category == EGGS and path != self.site_dir
+
+    def _get_idea_config_dirs(self) -> List[Path]:
+        if self.idea_config_dirs:
+            return self.idea_config_dirs
+        return find_ide_config_dirs()
+
+    def _write_application_library(self, name: Optional[str], paths: List[Path],
+                                   excluded_paths: List[Path]):
+        """Adds the library into the application-level library table
+        of every configuration directory of IDE. Existing libraries
+        with the same name are not changed, because their content
+        is the same. Libraries added by the recipe that are not used
+        by any registered part (see :class:`LibraryRegistry`) are removed.
+        ``name`` is ``None`` if the part doesn't use the library anymore.
+        """
+        from .registry import LibraryRegistry
+        config_dirs = self._get_idea_config_dirs()
+        if not config_dirs:
+            if name is None:
+                return
+            raise UserError(
+                'Configuration directory of PyCharm or IntelliJ IDEA has not '
+                'found. Specify it with the option "idea_config_dir".'
+            )
+        logger = logging.getLogger(self.name)
+        library_xml = None
+        if name is not None:
+            library_xml = render_library_element(name, paths, excluded_paths)
+        library_paths = [
+            config_dir / APPLICATION_LIBRARIES_PATH for config_dir in config_dirs
+        ]
+        # Parts are registered while their directories exist
+        self.part_dir.mkdir(parents=True, exist_ok=True)
+        unused = LibraryRegistry(self.library_registry_path).update(
+            str(self.part_dir), name, map(str, library_paths)
+        )
+        for path in library_paths:
+            removed_names = unused.get(str(path), ())
+            try:
+                data = path.read_bytes()
+            except FileNotFoundError:
+                data = None
+            try:
+                new_data = patch_application_libraries(
+                    data, name, library_xml, removed_names
                 )
-                with iml_path.open('wb') as f:
-                    f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-                    f.write(iml_data)
-                logging.getLogger(self.name).debug(
-                    f'IDEA project file updated ({iml_path}).'
+            except ValueError as e:
+                logger.warning(f'File {path} is not valid XML: {e}')
+                continue
+            if new_data is None:
+                if data is not None:
+                    self.metrics.add_write(path, len(data), False)
+                continue
+            written = write_if_changed(path, new_data)
+            self.metrics.add_write(path, len(new_data), written)
+            if name is not None:
+                logger.debug(f'Application library "{name}" has added into {path}.')
+            if removed_names:
+                logger.debug(
+                    f'Unused application libraries {", ".join(removed_names)} '
+                    f'have removed from {path}.'
                 )
+
+    def _get_excluded_paths(self, entries) -> List[Path]:
+        """Returns directories inside of roots of eggs and other
+        distributions that are matched with patterns from option
+        ``exclude``.
+        """
+        if not self.exclude:
+            return []
+        import glob
+        roots = [
+            str(path) for category, path, _ in entries
+            if category in (EGGS, OTHER) and os.path.isdir(path)
+        ]
+
+        def get_excluded(root: str) -> List[str]:
+            root = glob.escape(root)
+            return [
+                path
+                for pattern in self.exclude
+                for path in glob.glob(os.path.join(root, pattern))
+                if os.path.isdir(path)
+            ]
+
+        excluded = set()
+        for paths in map_concurrently(get_excluded, roots):
+            excluded.update(paths)
+        return [Path(path) for path in sorted(excluded)]
+
+    def _iter_library_entries(
+            self, entries: Iterable[Tuple[str, Path, Optional[str]]] = None,
+    ) -> Iterator[Tuple[str, Path, Optional[str]]]:
+        """Yields entries of library tables built from ``entries``
+        (by default from ``_iter_entries()``). Zipped eggs are replaced with
+        unpacked ones if option ``unzip_eggs`` is enabled. Directories
+        with stubs of compiled modules are added if option ``binary_stubs``
+        is enabled. Directories of eggs are replaced with the one directory
+        of the symlink farm if option ``symlink_farm`` is enabled.
+        """
+        if entries is None:
+            entries = self._iter_entries()
+        if self.unzip_eggs:
+            entries = self._replace_zipped_eggs(entries)
+        if self.binary_stubs:
+            entries = self._add_stubs(entries)
+        if self.symlink_farm:
+            entries = self._replace_with_symlink_farm(entries)
+        return entries
+
+    def _get_unzipped_cache(self) -> UnzippedEggsCache:
+        return UnzippedEggsCache(
+            self.unzip_cache_dir,
+            self.unzip_cache_size,
+            self.part_dir / 'unzipped.json',
+            logging.getLogger(self.name),
+        )
+
+    def _replace_zipped_eggs(self, entries):
+        entries = list(entries)
+        zipped_eggs = [
+            str(path) for category, path, _ in entries
+            if category == EGGS and not self.snapshot.is_dir(path)
+        ]
+        with self.metrics.phase('unzip'):
+            unzipped = self._get_unzipped_cache().get_dirs(zipped_eggs)
+        for category, path, project_name in entries:
+            unzipped_path = unzipped.get(str(path)) if category == EGGS else None
+            if unzipped_path:
+                yield category, Path(unzipped_path), project_name
+            else:
+                yield category, path, project_name
+
+    def _get_stubs_cache(self):
+        from .stubs import StubsCache
+        return StubsCache(
+            self.stubs_cache_dir,
+            self.part_dir / 'stubs.json',
+            logging.getLogger(self.name),
+        )
+
+    def _add_stubs(self, entries):
+        entries = list(entries)
+        eggs = {
+            str(path): project_name
+            for category, path, project_name in entries
+            if category == EGGS and self.snapshot.is_dir(path)
+        }
+        with self.metrics.phase('stubs'):
+            stubs_dirs = self._get_stubs_cache().get_dirs(
+                eggs, [str(path) for _, path, _ in entries]
+            )
+        yield from entries
+        for egg_path, project_name in eggs.items():
+            stubs_dir = stubs_dirs.get(egg_path)
+            if stubs_dir:
+                yield STUBS, Path(stubs_dir), project_name
+
+    def _replace_with_symlink_farm(self, entries):
+        egg_roots = []
+        for entry in entries:
+            category, path, _ = entry
+            if category == EGGS and os.path.isdir(path):
+                if not egg_roots:
+                    # The farm takes the place of the first egg
+                    yield EGGS, self.site_dir, None
+                egg_roots.append(str(path))
+            else:
+                yield entry
+
+        try:
+            with self.metrics.phase('symlink_farm'):
+                changes = SymlinkFarm(self.site_dir).build(egg_roots)
+        except OSError as e:
+            raise UserError(
+                f'Failed to create the symlink farm in {self.site_dir}: {e}'
+            )
+        logging.getLogger(self.name).debug(
+            f'Symlink farm of {len(egg_roots)} eggs has updated '
+            f'({changes} changed entries).'
+        )
+
+    def _get_library_files(self, idea_dir: Path) -> List[str]:
+        """Returns paths of existing files with libraries
+        created by this recipe.
+        """
+        libraries_dir = idea_dir / 'libraries'
+        file_name = get_library_file_name(LIBRARY_NAME)
+        return [
+            *self.snapshot.glob(libraries_dir, file_name),
+            *self.snapshot.glob(libraries_dir, file_name[:-4] + '_*.xml'),
+        ]
+
+    def _update_idea_project(self, iml_path: Path,
+                             libraries: List[LibraryRef] = None):
+        """Adds entries of given libraries into the module file and removes
+        entries of libraries that were created by previous runs.
+        """
+        if libraries is None:
+            libraries = [LibraryRef(self._library_name)]
+        logger = logging.getLogger(self.name)
+        iml_data = iml_path.read_bytes()
+        try:
+            new_iml_data = patch_module(iml_data, libraries, is_own_library)
+        except ValueError as e:
+            logger.warning(f'File {iml_path} is not valid XML: {e}')
+            return
+        if new_iml_data is None:
+            self.metrics.add_write(iml_path, len(iml_data), False)
+            return
+        written = write_if_changed(iml_path, new_iml_data)
+        self.metrics.add_write(iml_path, len(new_iml_data), written)
+        logger.debug(f'IDEA project file updated ({iml_path}).')
+
+
+def _get_optional_int(options, key: str,
+                      min_value: Optional[int] = None) -> Optional[int]:
+    value = options.get(key)
+    if not value:
+        return None
+    try:
+        result = int(value)
+    except ValueError:
+        raise UserError(f'Invalid value of option "{key}": {value}')
+    if min_value is not None and result < min_value:
+        raise UserError(
+            f'Invalid value of option "{key}": {value}. '
+            f'It must be at least {min_value}.'
+        )
+    return result
+
+
+class _OrderedPathSet:
+    """Set of canonical paths that remembers order of adding."""
+
+    __slots__ = ('_paths',)
+
+    def __init__(self):
+        self._paths = {}
+
+    def add(self, path: str) -> bool:
+        """Returns ``False`` if the path already is in the set."""
+        if path in self._paths:
+            return False
+        self._paths[path] = None
+        return True
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
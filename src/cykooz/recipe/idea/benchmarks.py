@@ -0,0 +1,252 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+
+Benchmarks of the recipe on synthetic buildouts.
+
+Run them explicitly::
+
+    ./bin/recipe_tests src/cykooz/recipe/idea/benchmarks.py -s
+
+Environment variables:
+
+RECIPE_BENCHMARK_SIZES
+    Comma separated numbers of eggs. Default: ``100,1000,5000``.
+    The largest supported size is 20000.
+RECIPE_BENCHMARK_GATE
+    Set it to ``true`` to fail if time or peak memory of any phase grows
+    faster than linearly with the number of eggs.
+RECIPE_BENCHMARK_REPORT
+    Path to a JSON-file to save results into.
+"""
+import gc
+import json
+import math
+import os
+import shutil
+import time
+import tracemalloc
+from pathlib import Path
+from sys import version_info
+
+from cykooz.recipe.idea import Recipe, resolution
+from cykooz.recipe.idea.tests import (
+    MockedBuildout,
+    build_env_fixture,  # noqa - pytest fixture
+)
+
+
+DEFAULT_SIZES = '100,1000,5000'
+MAX_SIZE = 20000
+# Maximal allowed slope of log(value)/log(size) in the gate mode.
+# 1.0 is an exactly linear growth, the rest is a tolerance to noise.
+MAX_SLOPE = 1.3
+# Phases that take less time are too noisy to check their slope.
+MIN_GATED_DURATION = 0.005
+
+
+def test_benchmark(build_env):
+    sizes = sorted(
+        int(size)
+        for size in os.environ.get('RECIPE_BENCHMARK_SIZES', DEFAULT_SIZES).split(',')
+        if size.strip()
+    )
+    assert sizes and sizes[-1] <= MAX_SIZE
+
+    results = {}
+    for size in sizes:
+        results[size] = run_benchmark(build_env, size)
+        print_results(size, results[size])
+
+    report_path = os.environ.get('RECIPE_BENCHMARK_REPORT')
+    if report_path:
+        with open(report_path, 'wt') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if os.environ.get('RECIPE_BENCHMARK_GATE', '').lower() in ('1', 'true', 'yes'):
+        check_linear_growth(results)
+
+
+def run_benchmark(build_env, size: int) -> dict:
+    """Generates a synthetic buildout with given number of eggs
+    and measures the phases of the recipe.
+    """
+    buildout_dir = Path(build_env.buildout_dir)
+    develop_count = max(1, size // 20)
+    extra_count = max(1, size // 10)
+    eggs = make_synthetic_buildout(buildout_dir, size, develop_count, extra_count)
+    (buildout_dir / '.idea').mkdir(exist_ok=True)
+    iml_path = buildout_dir / '.idea' / 'project.iml'
+    iml_data = make_large_iml(size // 10)
+
+    buildout = MockedBuildout(build_env.link_server)
+    buildout['buildout']['newest'] = 'false'
+    recipe = Recipe(
+        buildout, 'bench',
+        {
+            'eggs': '\n'.join(eggs),
+            'include_develop': 'true',
+            'extra-paths': str(buildout_dir / 'extra' / '*' / 'lib*'),
+        }
+    )
+
+    def clear_cache():
+        # zc.recipe.egg caches resolved working sets in the buildout instance
+        buildout.__dict__.pop('_zc_recipe_egg_working_set_cache', None)
+        resolution.clear_cache()
+
+    def reset_iml():
+        iml_path.write_text(iml_data)
+
+    def reset_outputs():
+        clear_cache()
+        reset_iml()
+        if recipe.fingerprint_path.exists():
+            recipe.fingerprint_path.unlink()
+
+    results = {
+        'get_paths': measure(recipe.get_paths, setup=clear_cache),
+        '_write_paths': measure(recipe._write_paths, setup=clear_cache),
+        '_update_idea_project': measure(
+            lambda: recipe._update_idea_project(iml_path),
+            setup=reset_iml,
+        ),
+        'install': measure(recipe.install, setup=reset_outputs),
+    }
+    roots_count = len(recipe.get_paths())
+    assert roots_count == size + develop_count + extra_count
+    return results
+
+
+def make_synthetic_buildout(buildout_dir: Path, size: int, develop_count: int,
+                            extra_count: int):
+    """Creates eggs, develop egg-links and extra directories.
+    Returns the list of requirements.
+    """
+    eggs_dir = buildout_dir / 'eggs'
+    develop_eggs_dir = buildout_dir / 'develop-eggs'
+    src_dir = buildout_dir / 'src'
+    extra_dir = buildout_dir / 'extra'
+    for path in (eggs_dir, develop_eggs_dir, src_dir, extra_dir):
+        if path.exists():
+            shutil.rmtree(path)
+        path.mkdir()
+
+    py_version = f'py{version_info.major}.{version_info.minor}'
+    requirements = []
+    for i in range(size):
+        name = f'benchegg{i:05d}'
+        egg_dir = eggs_dir / f'{name}-1.0-{py_version}.egg'
+        write_package(egg_dir, name, egg_dir / 'EGG-INFO')
+        requirements.append(name)
+
+    for i in range(develop_count):
+        name = f'benchdevelop{i:05d}'
+        project_dir = src_dir / name
+        write_package(project_dir, name, project_dir / f'{name}.egg-info')
+        (develop_eggs_dir / f'{name}.egg-link').write_text(f'{project_dir}\n.')
+        requirements.append(name)
+
+    for i in range(extra_count):
+        (extra_dir / f'group{i % 10}' / f'lib{i:05d}').mkdir(parents=True)
+
+    return requirements
+
+
+def write_package(root_dir: Path, name: str, info_dir: Path):
+    package_dir = root_dir / name
+    package_dir.mkdir(parents=True)
+    (package_dir / '__init__.py').write_text('')
+    info_dir.mkdir()
+    (info_dir / 'PKG-INFO').write_text(
+        f'Metadata-Version: 1.0\nName: {name}\nVersion: 1.0\n'
+    )
+    (info_dir / 'top_level.txt').write_text(f'{name}\n')
+
+
+def make_large_iml(entries_count: int) -> str:
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<module type="PYTHON_MODULE" version="4">',
+        '  <component name="NewModuleRootManager">',
+        '    <content url="file://$MODULE_DIR$">',
+    ]
+    lines.extend(
+        f'      <excludeFolder url="file://$MODULE_DIR$/excluded{i:05d}" />'
+        for i in range(entries_count)
+    )
+    lines.append('    </content>')
+    lines.extend(
+        f'    <orderEntry type="module" module-name="module{i:05d}" />'
+        for i in range(entries_count)
+    )
+    lines.extend((
+        '    <orderEntry type="sourceFolder" forTests="false" />',
+        '  </component>',
+        '</module>',
+        '',
+    ))
+    return '\n'.join(lines)
+
+
+def measure(func, setup=None) -> dict:
+    """Returns duration (in seconds) and peak of allocated memory
+    (in bytes) of the function call. Memory is measured by a separate
+    call because tracing slows down the code.
+    """
+    if setup:
+        setup()
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    duration = time.perf_counter() - start
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'duration': duration, 'peak_memory': peak_memory}
+
+
+def print_results(size: int, results: dict):
+    print(f'\nEggs: {size}')
+    for phase, values in results.items():
+        print(
+            f'  {phase:<22} {values["duration"] * 1000:10.1f} ms'
+            f' {values["peak_memory"] / 1024:12.1f} KiB'
+        )
+
+
+def check_linear_growth(results: dict):
+    sizes = sorted(results)
+    assert len(sizes) > 1, 'The gate mode requires at least two sizes.'
+    phases = results[sizes[0]].keys()
+    errors = []
+    for phase in phases:
+        for value_name in ('duration', 'peak_memory'):
+            values = [results[size][phase][value_name] for size in sizes]
+            if value_name == 'duration' and values[-1] < MIN_GATED_DURATION:
+                continue
+            slope = get_log_slope(sizes, values)
+            if slope > MAX_SLOPE:
+                errors.append(
+                    f'{value_name} of {phase} grows faster than linearly '
+                    f'(slope {slope:.2f})'
+                )
+    assert not errors, '\n'.join(errors)
+
+
+def get_log_slope(sizes, values) -> float:
+    """Returns a slope of least squares fit in log-log space."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-9)) for value in values]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    return numerator / denominator
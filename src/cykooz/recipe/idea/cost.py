@@ -0,0 +1,179 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .utils import get_mtime, map_concurrently, read_json_dict, write_if_changed
+
+
+BUDGET_WARN = 'warn'
+BUDGET_FAIL = 'fail'
+BUDGET_ACTIONS = (BUDGET_WARN, BUDGET_FAIL)
+
+
+class RootCost(NamedTuple):
+    path: str
+    category: str
+    files: int
+    py_files: int
+    size: int
+
+
+class CostEstimator:
+    """Estimates the cost of indexing of library roots by IDE -
+    numbers of files, Python files and total size of files.
+
+    Excluded directories are not counted. Zipped eggs are measured by
+    their central directory without extracting. Stats of roots inside
+    of immutable directories (e.g. eggs directory) are cached in a JSON
+    file while mtime of the root is the same, other roots are walked
+    on every run.
+    """
+
+    def __init__(self, cache_path: Path, immutable_dirs: Iterable[str],
+                 exclude: Sequence[str] = ()):
+        self.cache_path = cache_path
+        self.immutable_prefixes = tuple(
+            os.path.join(os.path.normpath(p), '') for p in immutable_dirs
+        )
+        self.exclude = list(exclude)
+
+    def estimate(self, entries: Iterable[Tuple[str, Path]],
+                 excluded_paths: Iterable[Path] = ()) -> List[RootCost]:
+        """Returns costs of roots given as tuples ``(category, path)``
+        sorted by number of files (most expensive roots go first).
+        """
+        entries = [(category, str(path)) for category, path in entries]
+        excluded = {str(path) for path in excluded_paths}
+        cache = self._read_cache()
+        new_cache = {}
+
+        def get_cost(entry: Tuple[str, str]) -> RootCost:
+            category, path = entry
+            mtime = get_mtime(path)
+            is_immutable = path.startswith(self.immutable_prefixes)
+            if is_immutable:
+                cached = cache.get(path)
+                if cached and cached[0] == mtime:
+                    new_cache[path] = cached
+                    return RootCost(path, category, *cached[1:])
+            stats = _measure(path, excluded)
+            if is_immutable and mtime is not None:
+                new_cache[path] = [mtime, *stats]
+            return RootCost(path, category, *stats)
+
+        costs = map_concurrently(get_cost, entries)
+        cache_data = {'exclude': self.exclude, 'roots': new_cache}
+        write_if_changed(
+            self.cache_path,
+            json.dumps(cache_data, indent=1, sort_keys=True).encode('utf-8'),
+        )
+        return sorted(costs, key=lambda c: (-c.files, -c.size, c.path))
+
+    def _read_cache(self) -> Dict[str, list]:
+        data = read_json_dict(self.cache_path)
+        if data.get('exclude') != self.exclude:
+            return {}
+        roots = data.get('roots')
+        return roots if isinstance(roots, dict) else {}
+
+
+def get_totals(costs: Sequence[RootCost]) -> dict:
+    return {
+        'roots': len(costs),
+        'files': sum(c.files for c in costs),
+        'py_files': sum(c.py_files for c in costs),
+        'size': sum(c.size for c in costs),
+    }
+
+
+def render_report(costs: Sequence[RootCost]) -> bytes:
+    report = {
+        'total': get_totals(costs),
+        'roots': [cost._asdict() for cost in costs],
+    }
+    return json.dumps(report, indent=1).encode('utf-8')
+
+
+def check_budget(costs: Sequence[RootCost], max_roots: Optional[int] = None,
+                 max_files: Optional[int] = None,
+                 max_size: Optional[int] = None) -> List[str]:
+    """Returns descriptions of exceeded limits."""
+    totals = get_totals(costs)
+    errors = []
+    for key, limit, option in (
+        ('roots', max_roots, 'max_roots'),
+        ('files', max_files, 'max_files'),
+        ('size', max_size, 'max_bytes'),
+    ):
+        if limit is not None and totals[key] > limit:
+            errors.append(
+                f'libraries have {totals[key]} {"bytes" if key == "size" else key}, '
+                f'the limit is {limit} (option "{option}")'
+            )
+    if errors and costs:
+        top = ', '.join(
+            f'{os.path.basename(c.path)} ({c.files} files)' for c in costs[:3]
+        )
+        errors.append(f'the most expensive roots: {top}')
+    return errors
+
+
+def _measure(path: str, excluded: Set[str]) -> Tuple[int, int, int]:
+    """Returns number of files, number of Python files
+    and total size of files inside of the root.
+    """
+    if os.path.isfile(path):
+        return _measure_zip(path)
+    files = py_files = size = 0
+    visited = set()
+    stack = [path]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if entry.path in excluded:
+                        continue
+                    if entry.is_symlink():
+                        # Guard against cycles of symbolic links
+                        stat = entry.stat()
+                        key = (stat.st_dev, stat.st_ino)
+                        if key in visited:
+                            continue
+                        visited.add(key)
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    files += 1
+                    size += entry.stat().st_size
+                    if entry.name.endswith('.py'):
+                        py_files += 1
+            except OSError:
+                continue
+    return files, py_files, size
+
+
+def _measure_zip(path: str) -> Tuple[int, int, int]:
+    import zipfile
+    try:
+        with zipfile.ZipFile(path) as zip_file:
+            infos = [info for info in zip_file.infolist() if not info.is_dir()]
+    except (OSError, zipfile.BadZipFile):
+        try:
+            return 1, int(path.endswith('.py')), os.path.getsize(path)
+        except OSError:
+            return 0, 0, 0
+    return (
+        len(infos),
+        sum(info.filename.endswith('.py') for info in infos),
+        sum(info.file_size for info in infos),
+    )
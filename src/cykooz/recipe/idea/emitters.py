@@ -0,0 +1,217 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import json
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Type
+
+from zc.buildout import UserError
+
+from .library import Entry
+from .utils import map_concurrently, write_if_changed
+
+if TYPE_CHECKING:
+    from . import IdeaTarget, Recipe
+
+
+DEFAULT_EMITTERS = ('idea',)
+
+
+class Emitter:
+    """Base class of outputs of the recipe. Every emitter gets the same
+    list of library entries, so the working set is resolved once
+    regardless of the number of emitters.
+    """
+
+    name = ''
+
+    def __init__(self, recipe: 'Recipe', options):
+        self.recipe = recipe
+
+    def is_active(self, targets: List['IdeaTarget']) -> bool:
+        """Returns ``False`` if the emitter has nothing to write."""
+        return True
+
+    def get_output_paths(self, targets: List['IdeaTarget']) -> List[Path]:
+        """Returns paths of files whose changes made by somebody else
+        must lead to regenerating of outputs.
+        """
+        return []
+
+    def emit(self, entries: List[Entry], targets: List['IdeaTarget']):
+        raise NotImplementedError
+
+
+class IdeaEmitter(Emitter):
+    """Writes library tables into Idea projects and adds them
+    into module files.
+    """
+
+    name = 'idea'
+
+    def is_active(self, targets: List['IdeaTarget']) -> bool:
+        return bool(targets)
+
+    def get_output_paths(self, targets: List['IdeaTarget']) -> List[Path]:
+        recipe = self.recipe
+        paths = []
+        for target in targets:
+            paths.append(target.result_path)
+            paths.extend(map(Path, recipe._get_library_files(target.idea_dir)))
+            paths.extend(target.iml_paths)
+        return paths
+
+    def emit(self, entries: List[Entry], targets: List['IdeaTarget']):
+        recipe = self.recipe
+        libraries = recipe._write_paths(
+            [target.idea_dir for target in targets], entries
+        )
+        with recipe.metrics.phase('iml'):
+            map_concurrently(
+                lambda iml_path: recipe._update_idea_project(iml_path, libraries),
+                [path for target in targets for path in target.iml_paths],
+            )
+
+
+class FileEmitter(Emitter):
+    """Base class of emitters that write paths into one file.
+    The file is written only if its content has changed.
+    """
+
+    # Name of the option with path to the file
+    option_name = ''
+
+    def __init__(self, recipe: 'Recipe', options):
+        super().__init__(recipe, options)
+        path = options.get(self.option_name) or self.get_default_path()
+        self.path = Path(recipe.buildout['buildout']['directory'], path)
+
+    def get_default_path(self) -> Path:
+        raise NotImplementedError
+
+    def get_output_paths(self, targets: List['IdeaTarget']) -> List[Path]:
+        return [self.path]
+
+    def render(self, entries: List[Entry], data: Optional[bytes]) -> bytes:
+        """Returns new content of the file. ``data`` is the current content
+        of the file or ``None`` if the file is absent.
+        """
+        raise NotImplementedError
+
+    def emit(self, entries: List[Entry], targets: List['IdeaTarget']):
+        recipe = self.recipe
+        logger = logging.getLogger(recipe.name)
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            data = None
+        with recipe.metrics.phase(f'render_{self.name}'):
+            try:
+                new_data = self.render(entries, data)
+            except ValueError as e:
+                logger.warning(f'File {self.path} has not updated: {e}')
+                return
+        with recipe.metrics.phase(f'write_{self.name}'):
+            written = write_if_changed(self.path, new_data)
+        recipe.metrics.add_write(self.path, len(new_data), written)
+        if written:
+            logger.debug(f'List of paths has written into the file "{self.path}".')
+
+
+class PthEmitter(FileEmitter):
+    """Writes paths into the text file, one path per line,
+    like ``.pth`` files of ``site`` module.
+    """
+
+    name = 'pth'
+    option_name = 'pth_file'
+
+    def get_default_path(self) -> Path:
+        return self.recipe.part_dir / 'paths.pth'
+
+    def render(self, entries: List[Entry], data: Optional[bytes]) -> bytes:
+        return ''.join(f'{path}\n' for _, path, _ in entries).encode('utf-8')
+
+
+class JsonEmitter(FileEmitter):
+    """Sets the list of paths as value of a key of the JSON object.
+    Other keys of the existing file are kept.
+    """
+
+    key = ''
+
+    def render(self, entries: List[Entry], data: Optional[bytes]) -> bytes:
+        content = {}
+        if data and data.strip():
+            try:
+                content = json.loads(data.decode('utf-8'))
+            except ValueError as e:
+                raise ValueError(f'it is not valid JSON ({e})')
+            if not isinstance(content, dict):
+                raise ValueError('it does not contain JSON object')
+        content[self.key] = [path.as_posix() for _, path, _ in entries]
+        return (json.dumps(content, indent=2) + '\n').encode('utf-8')
+
+
+class PyrightEmitter(JsonEmitter):
+    name = 'pyright'
+    option_name = 'pyright_config'
+    key = 'extraPaths'
+
+    def get_default_path(self) -> Path:
+        return Path('pyrightconfig.json')
+
+
+class VsCodeEmitter(JsonEmitter):
+    name = 'vscode'
+    option_name = 'vscode_settings'
+    key = 'python.analysis.extraPaths'
+
+    def get_default_path(self) -> Path:
+        return Path('.vscode', 'settings.json')
+
+
+class ModuleIndexEmitter(FileEmitter):
+    """Writes the index of top-level modules and packages
+    of library roots (see :mod:`cykooz.recipe.idea.module_index`).
+    """
+
+    name = 'module_index'
+    option_name = 'module_index'
+
+    def get_default_path(self) -> Path:
+        return self.recipe.part_dir / 'modules.json'
+
+    def render(self, entries: List[Entry], data: Optional[bytes]) -> bytes:
+        from .module_index import build_index
+        return build_index(entries, data)
+
+
+EMITTERS: Dict[str, Type[Emitter]] = {}
+
+
+def register_emitter(emitter_class: Type[Emitter]):
+    """Registers the emitter class by its name, so it can be used
+    in the option ``emitters``.
+    """
+    EMITTERS[emitter_class.name] = emitter_class
+    return emitter_class
+
+
+for _emitter_class in (
+    IdeaEmitter, PthEmitter, PyrightEmitter, VsCodeEmitter, ModuleIndexEmitter,
+):
+    register_emitter(_emitter_class)
+
+
+def create_emitters(recipe: 'Recipe', options) -> List[Emitter]:
+    names = (options.get('emitters') or ' '.join(DEFAULT_EMITTERS)).split()
+    unknown = [name for name in names if name not in EMITTERS]
+    if unknown:
+        raise UserError(
+            f'Invalid value of option "emitters": {", ".join(unknown)}. '
+            f'Possible values: {", ".join(EMITTERS)}.'
+        )
+    return [EMITTERS[name](recipe, options) for name in dict.fromkeys(names)]
@@ -0,0 +1,145 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from .utils import write_if_changed
+
+
+# Entries of eggs that can't be imported
+_SKIPPED_NAMES = {'EGG-INFO', '__pycache__'}
+_SKIPPED_SUFFIXES = ('.egg-info', '.dist-info', '.pth')
+_MODULE_SUFFIXES = ('.py', '.pyi', '.pyc', '.so', '.pyd')
+
+# Mapping of relative paths inside of farm to targets of symlinks.
+# ``None`` is used for real directories that merge content of
+# the same package from several eggs (namespace packages).
+FarmLayout = Dict[str, Optional[str]]
+
+
+class SymlinkFarm:
+    """Directory with symlinks to top-level packages and modules
+    of eggs. It is used as a single root of the library instead of
+    hundreds of roots of eggs.
+    """
+
+    def __init__(self, site_dir: Path):
+        self.site_dir = site_dir
+        self.manifest_path = site_dir.with_name(site_dir.name + '.json')
+
+    def build(self, roots: Iterable[str]) -> int:
+        """Creates or incrementally updates the farm.
+        Returns number of changed entries.
+        """
+        layout = get_farm_layout(roots)
+        old_layout = self._read_manifest()
+        if old_layout is None:
+            # State of the directory is unknown
+            if self.site_dir.exists():
+                shutil.rmtree(self.site_dir)
+            old_layout = {}
+        self.site_dir.mkdir(parents=True, exist_ok=True)
+
+        removed = [
+            rel_path for rel_path, target in old_layout.items()
+            if layout.get(rel_path, False) != target
+        ]
+        # Children are removed before parents
+        for rel_path in sorted(removed, reverse=True):
+            path = self.site_dir / rel_path
+            if path.is_symlink() or path.is_file():
+                path.unlink()
+            elif path.is_dir():
+                shutil.rmtree(path)
+
+        created = [
+            rel_path for rel_path, target in layout.items()
+            if old_layout.get(rel_path, False) != target
+        ]
+        # Parents are created before children
+        for rel_path in sorted(created):
+            path = self.site_dir / rel_path
+            target = layout[rel_path]
+            if target is None:
+                path.mkdir(exist_ok=True)
+            else:
+                os.symlink(target, path, target_is_directory=os.path.isdir(target))
+
+        data = json.dumps(layout, indent=1, sort_keys=True).encode('utf-8')
+        write_if_changed(self.manifest_path, data)
+        return len(removed) + len(created)
+
+    def _read_manifest(self) -> Optional[FarmLayout]:
+        if not self.site_dir.is_dir():
+            return None
+        try:
+            with self.manifest_path.open('rt') as f:
+                layout = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return layout if isinstance(layout, dict) else None
+
+
+def get_farm_layout(roots: Iterable[str]) -> FarmLayout:
+    """Returns layout of the farm for given roots of eggs.
+    The first root wins if several roots have a module with the same name,
+    the same as in ``sys.path``.
+    """
+    layout: FarmLayout = {}
+    for root in roots:
+        for name, path in _iter_importable(root):
+            _add_to_layout(layout, name, path)
+    return layout
+
+
+def _add_to_layout(layout: FarmLayout, rel_path: str, target: str):
+    if rel_path not in layout:
+        layout[rel_path] = target
+        return
+    existing = layout[rel_path]
+    if existing is not None:
+        if not (os.path.isdir(existing) and os.path.isdir(target)):
+            return
+        # Package with the same name from several eggs
+        # becomes a directory with merged content.
+        layout[rel_path] = None
+        _add_children(layout, rel_path, existing)
+    if os.path.isdir(target):
+        _add_children(layout, rel_path, target)
+
+
+def _add_children(layout: FarmLayout, rel_path: str, dir_path: str):
+    try:
+        names = sorted(os.listdir(dir_path))
+    except OSError:
+        return
+    for name in names:
+        if name != '__pycache__':
+            _add_to_layout(
+                layout,
+                f'{rel_path}/{name}',
+                os.path.join(dir_path, name),
+            )
+
+
+def _iter_importable(root: str):
+    """Yields names and paths of top-level packages and modules of the egg."""
+    try:
+        entries = sorted(os.scandir(root), key=lambda e: e.name)
+    except OSError:
+        return
+    for entry in entries:
+        name = entry.name
+        if (
+            name in _SKIPPED_NAMES
+            or name.startswith('.')
+            or name.endswith(_SKIPPED_SUFFIXES)
+        ):
+            continue
+        if entry.is_dir() or name.endswith(_MODULE_SUFFIXES):
+            yield name, entry.path
@@ -0,0 +1,311 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+from html import escape
+from typing import Callable, Collection, List, NamedTuple, Optional, Sequence, Tuple
+from xml.parsers import expat
+
+
+COMPONENT_NAME = 'NewModuleRootManager'
+LIBRARY_TABLE_NAME = 'libraryTable'
+LEVEL_PROJECT = 'project'
+LEVEL_APPLICATION = 'application'
+_CHUNK_SIZE = 64 * 1024
+_DEFAULT_INDENT = '  '
+
+
+class LibraryRef(NamedTuple):
+    name: str
+    level: str = LEVEL_PROJECT
+
+
+class _Element(NamedTuple):
+    tag: str
+    start: int
+    # Offset of the first byte after the element
+    end: int
+    attrs: dict
+
+
+class _Component(NamedTuple):
+    start: int
+    # Offset of the end tag, or offset of "/>" of the empty-element tag
+    end_tag: int
+    is_empty: bool
+    children: List[_Element]
+
+
+# Tuple (start, end, replacement)
+_Edit = Tuple[int, int, bytes]
+
+
+class _Done(Exception):
+    pass
+
+
+def patch_module(
+        data: bytes,
+        libraries: Sequence[LibraryRef],
+        is_own_library: Callable[[str], bool],
+) -> Optional[bytes]:
+    """Returns content of the module file (``.iml``) with ``orderEntry``
+    elements of given libraries, and without own libraries
+    (recognized by ``is_own_library``) that are absent in ``libraries``.
+
+    Only bytes of added or removed elements are changed, the rest of
+    the file is kept as is. Returns ``None`` if the file has not
+    ``NewModuleRootManager`` component or already has required entries.
+    Raises ``ValueError`` if the file is not valid XML.
+    """
+    component = _find_component(data, COMPONENT_NAME)
+    if component is None:
+        return None
+
+    existing = set()
+    removed = []
+    for child in component.children:
+        name = child.attrs.get('name', '')
+        if (
+            child.tag == 'orderEntry'
+            and child.attrs.get('type') == 'library'
+            and is_own_library(name)
+        ):
+            library = LibraryRef(name, child.attrs.get('level', ''))
+            if library in libraries and library not in existing:
+                existing.add(library)
+            else:
+                removed.append(child)
+    added = [library for library in libraries if library not in existing]
+    if not added and not removed:
+        return None
+
+    edits: List[_Edit] = []
+    for child in removed:
+        start, end = _expand_to_lines(data, child.start, child.end)
+        edits.append((start, end, b''))
+    if added:
+        kept = [child for child in component.children if child not in removed]
+        blocks = [
+            f'<orderEntry type="library" name="{escape(name)}" level="{escape(level)}" />'
+            for name, level in added
+        ]
+        edits.append(_get_insert_edit(data, component, kept, blocks))
+    return _apply_edits(data, edits)
+
+
+def patch_application_libraries(data: Optional[bytes], name: Optional[str],
+                                library_xml: Optional[str],
+                                removed_names: Collection[str] = ()) -> Optional[bytes]:
+    """Returns content of the file with application-level libraries
+    (``options/applicationLibraries.xml`` inside of the IDE configuration
+    directory) with the library that has the given name and without
+    libraries with ``removed_names``. Other libraries and the rest of
+    the file are kept as is. ``name`` may be ``None`` to remove
+    libraries only.
+
+    Returns ``None`` if the file doesn't need changes.
+    Raises ``ValueError`` if the file is not valid XML.
+    """
+    newline = '\n'
+    if not data:
+        if name is None:
+            return None
+        return newline.join((
+            '<application>',
+            f'  <component name="{LIBRARY_TABLE_NAME}">',
+            _indent(library_xml, '    ', newline),
+            '  </component>',
+            '</application>',
+            '',
+        )).encode('utf-8')
+
+    component = _find_component(data, LIBRARY_TABLE_NAME)
+    if component is None:
+        if name is None:
+            return None
+        # Add the component into the end of the root element
+        end_tag = data.rfind(b'</')
+        if end_tag < 0:
+            raise ValueError('The root element has not found.')
+        newline = _get_newline(data)
+        text = newline.join((
+            f'  <component name="{LIBRARY_TABLE_NAME}">',
+            _indent(library_xml, '    ', newline),
+            '  </component>',
+            '',
+        ))
+        return _apply_edits(data, [(end_tag, end_tag, text.encode('utf-8'))])
+
+    exists = name is None
+    removed = []
+    for child in component.children:
+        if child.tag != 'library':
+            continue
+        child_name = child.attrs.get('name')
+        if child_name == name:
+            exists = True
+        elif child_name in removed_names:
+            removed.append(child)
+    if exists and not removed:
+        return None
+    edits: List[_Edit] = []
+    for child in removed:
+        start, end = _expand_to_lines(data, child.start, child.end)
+        edits.append((start, end, b''))
+    if not exists:
+        kept = [child for child in component.children if child not in removed]
+        edits.append(_get_insert_edit(data, component, kept, [library_xml]))
+    return _apply_edits(data, edits)
+
+
+def _get_insert_edit(data: bytes, component: _Component,
+                     children: List[_Element], blocks: List[str]) -> _Edit:
+    """Returns the edit that adds given blocks of XML
+    after the last of given children of the component.
+    """
+    newline = _get_newline(data)
+    component_indent = _get_indent(data, component.start)
+    if component.children:
+        child_indent = _get_indent(data, component.children[0].start)
+    else:
+        child_indent = component_indent + _DEFAULT_INDENT
+    blocks = [_indent(block, child_indent, newline) for block in blocks]
+
+    if children:
+        offset = children[-1].end
+        text = ''.join(f'{newline}{block}' for block in blocks)
+        return offset, offset, text.encode('utf-8')
+    if component.is_empty:
+        # <component name="..." /> -> <component name="...">...</component>
+        start = component.end_tag
+        while data[start - 1:start].isspace():
+            start -= 1
+        text = ''.join(f'{newline}{block}' for block in blocks)
+        text = f'>{text}{newline}{component_indent}</component>'
+        return start, component.end_tag + 2, text.encode('utf-8')
+    offset = component.end_tag
+    line_start = data.rfind(b'\n', 0, offset) + 1
+    if data[line_start:offset].strip():
+        text = ''.join(f'{newline}{block}' for block in blocks)
+        text += newline + component_indent
+    else:
+        # End tag is on a separate line
+        offset = line_start
+        text = ''.join(f'{block}{newline}' for block in blocks)
+    return offset, offset, text.encode('utf-8')
+
+
+def _apply_edits(data: bytes, edits: List[_Edit]) -> bytes:
+    parts = []
+    position = 0
+    for start, end, replacement in sorted(edits):
+        parts.append(data[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(data[position:])
+    return b''.join(parts)
+
+
+def _find_component(data: bytes, component_name: str) -> Optional[_Component]:
+    """Finds the component with given name (a child of the root element)
+    and its children by incremental parsing. Parsing is stopped at the end
+    of the component.
+    """
+    parser = expat.ParserCreate()
+    stack = []
+    result = []
+
+    def start_element(name, attrs):
+        offset = parser.CurrentByteIndex
+        depth = len(stack)
+        stack.append(offset)
+        if result and depth == 2:
+            result[0].children.append(_Element(name, offset, -1, attrs))
+        elif (
+            not result and depth == 1
+            and name == 'component' and attrs.get('name') == component_name
+        ):
+            result.append(_Component(offset, -1, False, []))
+
+    def end_element(name):
+        start = stack.pop()
+        depth = len(stack)
+        if not result:
+            return
+        if depth == 2:
+            children = result[0].children
+            children[-1] = children[-1]._replace(
+                end=_get_element_end(data, start, parser.CurrentByteIndex),
+            )
+        elif depth == 1:
+            tag_end = _find_tag_end(data, start)
+            if data[tag_end - 2:tag_end] == b'/>':
+                result[0] = result[0]._replace(end_tag=tag_end - 2, is_empty=True)
+            else:
+                result[0] = result[0]._replace(end_tag=parser.CurrentByteIndex)
+            raise _Done()
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    try:
+        for offset in range(0, len(data), _CHUNK_SIZE):
+            parser.Parse(data[offset:offset + _CHUNK_SIZE], False)
+        parser.Parse(b'', True)
+    except _Done:
+        pass
+    except expat.ExpatError as e:
+        raise ValueError(str(e)) from e
+    return result[0] if result else None
+
+
+def _get_element_end(data: bytes, start: int, end_event_offset: int) -> int:
+    tag_end = _find_tag_end(data, start)
+    if data[tag_end - 2:tag_end] == b'/>':
+        return tag_end
+    return _find_tag_end(data, end_event_offset)
+
+
+def _find_tag_end(data: bytes, start: int) -> int:
+    """Returns offset of the first byte after the tag
+    that starts at the given offset.
+    """
+    quote = None
+    for offset in range(start, len(data)):
+        char = data[offset]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in b'"\'':
+            quote = char
+        elif char == ord('>'):
+            return offset + 1
+    return len(data)
+
+
+def _get_newline(data: bytes) -> str:
+    return '\r\n' if b'\r\n' in data else '\n'
+
+
+def _indent(block: str, indent: str, newline: str) -> str:
+    return newline.join(indent + line for line in block.split('\n'))
+
+
+def _get_indent(data: bytes, offset: int) -> str:
+    line_start = data.rfind(b'\n', 0, offset) + 1
+    prefix = data[line_start:offset]
+    if prefix.strip():
+        return ''
+    return prefix.decode('utf-8')
+
+
+def _expand_to_lines(data: bytes, start: int, end: int) -> Tuple[int, int]:
+    """Expands the range to whole lines if they contain nothing
+    except the range.
+    """
+    line_start = data.rfind(b'\n', 0, start) + 1
+    line_end = data.find(b'\n', end)
+    line_end = len(data) if line_end < 0 else line_end + 1
+    if data[line_start:start].strip() or data[end:line_end].strip():
+        return start, end
+    return line_start, line_end
@@ -0,0 +1,194 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import ast
+import fnmatch
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from .metadata import list_top_level, read_requires, read_top_level
+from .snapshot import normalize_project_name
+from .utils import MAX_WORKERS, map_concurrently, read_json_dict, write_if_changed
+
+
+# Directories that never contain sources of the project
+_SKIPPED_DIRS = (
+    '.*', '__pycache__', 'node_modules', 'EGG-INFO', '*.egg-info', '*.dist-info',
+)
+# Minimal number of files to scan in a process pool
+_MIN_POOL_FILES = 64
+_CHUNK_SIZE = 32
+
+
+class ImportsCache:
+    """Top-level names imported by Python files.
+
+    Names are cached in a JSON file by paths of source files,
+    a file is parsed again only if its size or mtime has changed.
+    Files are parsed in a process pool.
+    """
+
+    def __init__(self, cache_path: Path, logger: logging.Logger,
+                 max_workers: int = MAX_WORKERS):
+        self.cache_path = cache_path
+        self.logger = logger
+        self.max_workers = max_workers
+
+    def get_imported_names(self, roots: Iterable[str],
+                           exclude: Sequence[str] = (),
+                           skip_dirs: Iterable[str] = ()) -> Set[str]:
+        """Returns top-level names imported by Python files
+        inside of given directories.
+        """
+        cache = self._read_cache()
+        new_cache = {}
+        missing = []
+        skip_dirs = {os.path.normpath(p) for p in skip_dirs}
+        for root in roots:
+            for path, stat in _iter_source_files(root, exclude, skip_dirs):
+                entry = cache.get(path)
+                if entry and entry[:2] == stat:
+                    new_cache[path] = entry
+                else:
+                    missing.append((path, stat))
+
+        if missing:
+            paths = [path for path, _ in missing]
+            if len(paths) >= _MIN_POOL_FILES and self.max_workers > 1:
+                from concurrent.futures import ProcessPoolExecutor
+                chunks = [
+                    paths[i:i + _CHUNK_SIZE]
+                    for i in range(0, len(paths), _CHUNK_SIZE)
+                ]
+                workers = min(self.max_workers, len(chunks))
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = [
+                        names
+                        for chunk_names in executor.map(_scan_files, chunks)
+                        for names in chunk_names
+                    ]
+            else:
+                results = _scan_files(paths)
+            for (path, stat), names in zip(missing, results):
+                new_cache[path] = [*stat, names]
+            self.logger.debug(f'Imports of {len(missing)} files have scanned.')
+
+        write_if_changed(
+            self.cache_path,
+            json.dumps(new_cache, indent=1, sort_keys=True).encode('utf-8'),
+        )
+        return {name for _, _, names in new_cache.values() for name in names}
+
+    def _read_cache(self) -> Dict[str, list]:
+        return read_json_dict(self.cache_path)
+
+
+def get_hot_projects(imported_names: Set[str],
+                     dists: Iterable[Tuple[str, str]]) -> Set[str]:
+    """Returns normalized names of projects that provide imported names
+    and projects that they require (recursively).
+
+    ``dists`` are tuples ``(project name, location)``. Names of top-level
+    packages are taken from ``top_level.txt``, or from the content
+    of the location if metadata has not this file.
+    """
+    dists = list(dists)
+    locations: Dict[str, int] = {}
+    for _, location in dists:
+        locations[location] = locations.get(location, 0) + 1
+
+    def get_top_level(dist):
+        project_name, location = dist
+        names = read_top_level(location, project_name)
+        if names is None and locations[location] == 1:
+            names = list_top_level(location)
+        return names or []
+
+    providers: Dict[str, Set[str]] = {}
+    requires: Dict[str, List[str]] = {}
+    dist_infos = zip(
+        dists,
+        map_concurrently(get_top_level, dists),
+        map_concurrently(lambda d: read_requires(d[1], d[0]), dists),
+    )
+    for (project_name, _), top_level, project_requires in dist_infos:
+        key = normalize_project_name(project_name)
+        requires[key] = project_requires
+        for name in top_level:
+            # Namespace packages are provided by several projects
+            providers.setdefault(name.split('/')[0], set()).add(key)
+
+    hot = set()
+    stack = [
+        project
+        for name in imported_names
+        for project in providers.get(name, ())
+    ]
+    while stack:
+        project = stack.pop()
+        if project in hot:
+            continue
+        hot.add(project)
+        stack.extend(r for r in requires.get(project, ()) if r in requires)
+    return hot
+
+
+def get_imported_names(source: str) -> Set[str]:
+    """Returns top-level names of modules imported by the source code.
+    Relative imports are skipped.
+    """
+    tree = ast.parse(source)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level == 0 and node.module:
+                names.add(node.module.split('.')[0])
+    return names
+
+
+def _scan_files(paths: List[str]) -> List[List[str]]:
+    """Returns sorted imported names for every file.
+    It is called in a separate process.
+    """
+    results = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                names = sorted(get_imported_names(f.read()))
+        except (OSError, SyntaxError, ValueError):
+            names = []
+        results.append(names)
+    return results
+
+
+def _iter_source_files(root: str, exclude: Sequence[str],
+                       skip_dirs: Set[str]) -> Iterator[Tuple[str, list]]:
+    """Yields paths of Python files with their sizes and mtimes."""
+    for dir_path, dir_names, file_names in os.walk(root):
+        rel_dir = os.path.relpath(dir_path, root)
+        dir_names[:] = [
+            name for name in dir_names
+            if not _is_skipped(name, os.path.join(rel_dir, name), exclude)
+            and os.path.join(dir_path, name) not in skip_dirs
+        ]
+        for name in file_names:
+            if name.endswith('.py'):
+                path = os.path.join(dir_path, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, [stat.st_size, stat.st_mtime_ns]
+
+
+def _is_skipped(name: str, rel_path: str, exclude: Sequence[str]) -> bool:
+    if any(fnmatch.fnmatch(name, pattern) for pattern in _SKIPPED_DIRS):
+        return True
+    rel_path = os.path.normpath(rel_path).replace(os.sep, '/')
+    return any(fnmatch.fnmatch(rel_path, pattern) for pattern in exclude)
@@ -0,0 +1,238 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import hashlib
+import os
+import re
+import sys
+import zlib
+from html import escape
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .snapshot import normalize_project_name
+
+
+LIBRARY_NAME = 'Buildout Eggs'
+
+SPLIT_NONE = 'none'
+SPLIT_CATEGORY = 'category'
+SPLIT_HASH = 'hash'
+SPLIT_IMPORTS = 'imports'
+SPLIT_MODES = (SPLIT_NONE, SPLIT_CATEGORY, SPLIT_HASH, SPLIT_IMPORTS)
+HOT_LIBRARY_NAME = f'{LIBRARY_NAME} hot'
+COLD_LIBRARY_NAME = f'{LIBRARY_NAME} cold'
+
+OVERLAP_KEEP = 'keep'
+OVERLAP_ANCESTOR = 'ancestor'
+OVERLAP_SPECIFIC = 'specific'
+OVERLAP_MODES = (OVERLAP_KEEP, OVERLAP_ANCESTOR, OVERLAP_SPECIFIC)
+
+DEFAULT_EXCLUDE = (
+    'EGG-INFO',
+    '*.egg-info',
+    '*.dist-info',
+    '__pycache__',
+    '*/__pycache__',
+    'tests',
+    '*/tests',
+    '*/*/tests',
+    'docs',
+    '*/docs',
+)
+
+# Prefixes of names of configuration directories of IDEs
+# that support Python libraries.
+IDE_CONFIG_PREFIXES = ('PyCharm', 'PyCharmCE', 'IntelliJIdea', 'IdeaIC')
+APPLICATION_LIBRARIES_PATH = Path('options') / 'applicationLibraries.xml'
+
+# Tuple (category, path, project name)
+Entry = Tuple[str, Path, Optional[str]]
+
+
+def render_library(name: str, paths: Iterable[Path],
+                   excluded_paths: Iterable[Path] = ()) -> bytes:
+    """Returns content of Idea's file with the library table."""
+    lines = [
+        '<component name="libraryTable">',
+        render_library_element(name, paths, excluded_paths, '  '),
+        '</component>',
+        '',
+    ]
+    return '\n'.join(lines).encode('utf-8')
+
+
+def render_library_element(name: str, paths: Iterable[Path],
+                           excluded_paths: Iterable[Path] = (),
+                           indent: str = '') -> str:
+    """Returns XML of the ``library`` element without trailing newline."""
+    lines = [
+        f'<library name="{escape(name, quote=False)}" type="python">',
+        f'  <CLASSES>',
+    ]
+    for path in paths:
+        lines.append(
+            f'    <root url="file://{escape(path.as_posix(), quote=False)}" />'
+        )
+    lines.extend((
+        '  </CLASSES>',
+        '  <JAVADOC />',
+        '  <SOURCES />',
+    ))
+    excluded_lines = [
+        f'    <root url="file://{escape(path.as_posix(), quote=False)}" />'
+        for path in excluded_paths
+    ]
+    if excluded_lines:
+        lines.append('  <excluded>')
+        lines.extend(excluded_lines)
+        lines.append('  </excluded>')
+    lines.append('</library>')
+    return '\n'.join(indent + line for line in lines)
+
+
+def get_application_library_name(paths: Iterable[Path],
+                                 excluded_paths: Iterable[Path] = ()) -> str:
+    """Returns name of the application-level library that is
+    unique for the content of the library.
+    """
+    data = '\n'.join([
+        *(path.as_posix() for path in paths),
+        '',
+        *(path.as_posix() for path in excluded_paths),
+    ])
+    digest = hashlib.sha1(data.encode('utf-8')).hexdigest()
+    return f'{LIBRARY_NAME} {digest[:12]}'
+
+
+def find_ide_config_dirs() -> List[Path]:
+    """Returns configuration directories of the latest installed versions
+    of PyCharm and IntelliJ IDEA (one directory for every product).
+    """
+    if sys.platform == 'win32':
+        base_dir = os.environ.get('APPDATA') or Path.home() / 'AppData' / 'Roaming'
+    elif sys.platform == 'darwin':
+        base_dir = Path.home() / 'Library' / 'Application Support'
+    else:
+        base_dir = os.environ.get('XDG_CONFIG_HOME') or Path.home() / '.config'
+    jetbrains_dir = Path(base_dir) / 'JetBrains'
+    try:
+        dir_names = os.listdir(jetbrains_dir)
+    except OSError:
+        return []
+
+    latest = {}
+    for dir_name in dir_names:
+        match = re.fullmatch(r'([A-Za-z]+)(\d+(?:\.\d+)*)', dir_name)
+        if not match or match.group(1) not in IDE_CONFIG_PREFIXES:
+            continue
+        product, version = match.groups()
+        version = tuple(int(part) for part in version.split('.'))
+        if product not in latest or latest[product][0] < version:
+            latest[product] = (version, dir_name)
+    return sorted(jetbrains_dir / dir_name for _, dir_name in latest.values())
+
+
+def get_library_file_name(name: str) -> str:
+    """Returns name of file that Idea uses for the library with given name."""
+    return re.sub(r'[^a-zA-Z0-9]', '_', name) + '.xml'
+
+
+def is_own_library(name: str) -> bool:
+    """Returns ``True`` if the library has created by this recipe."""
+    return name == LIBRARY_NAME or name.startswith(LIBRARY_NAME + ' ')
+
+
+def split_entries(
+        entries: Iterable[Entry],
+        mode: str,
+        buckets: int,
+        hot_projects: Optional[Set[str]] = None,
+) -> Dict[str, List[Entry]]:
+    """Splits entries into libraries. Returns lists of entries
+    by names of libraries.
+
+    Entries are tuples ``(category, path, project_name)``.
+    Project name is used to choose a hash bucket, so the library
+    of a project stays the same after changing its version.
+    In mode ``imports`` entries of projects from ``hot_projects``
+    and entries without project go into the "hot" library.
+    """
+    if mode == SPLIT_NONE:
+        return {LIBRARY_NAME: list(entries)}
+
+    libraries = {}
+    for entry in entries:
+        category, path, project_name = entry
+        if mode == SPLIT_CATEGORY:
+            name = f'{LIBRARY_NAME} {category}'
+        elif mode == SPLIT_IMPORTS:
+            if not project_name or normalize_project_name(project_name) in hot_projects:
+                name = HOT_LIBRARY_NAME
+            else:
+                name = COLD_LIBRARY_NAME
+        else:
+            key = normalize_project_name(project_name) if project_name else path.as_posix()
+            bucket = zlib.crc32(key.encode('utf-8')) % buckets
+            name = f'{LIBRARY_NAME} {bucket:02d}'
+        libraries.setdefault(name, []).append(entry)
+    if mode == SPLIT_IMPORTS:
+        # The hot library goes first
+        return {
+            name: libraries[name]
+            for name in (HOT_LIBRARY_NAME, COLD_LIBRARY_NAME)
+            if name in libraries
+        }
+    return dict(sorted(libraries.items()))
+
+
+class _TrieNode:
+    __slots__ = ('children', 'is_root', 'has_roots_inside')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.is_root = False
+        self.has_roots_inside = False
+
+
+def remove_overlapping_entries(entries: Iterable[Entry], mode: str) -> List[Entry]:
+    """Removes entries whose roots overlap with roots of other entries.
+    Paths must be canonical (absolute and without symbolic links).
+
+    In mode ``ancestor`` roots that are inside of other roots are removed,
+    in mode ``specific`` roots that contain other roots are removed.
+    Order of remaining entries is kept.
+    """
+    entries = list(entries)
+    if mode == OVERLAP_KEEP:
+        return entries
+
+    # Prefix tree of components of paths
+    trie = _TrieNode()
+    nodes = []
+    for _, path, _ in entries:
+        node = trie
+        for part in path.parts:
+            node.has_roots_inside = True
+            node = node.children.setdefault(part, _TrieNode())
+        node.is_root = True
+        nodes.append(node)
+
+    if mode == OVERLAP_SPECIFIC:
+        return [
+            entry for entry, node in zip(entries, nodes)
+            if not node.has_roots_inside
+        ]
+
+    result = []
+    for entry in entries:
+        node = trie
+        parts = entry[1].parts
+        for part in parts[:-1]:
+            node = node.children[part]
+            if node.is_root:
+                break
+        else:
+            result.append(entry)
+    return result
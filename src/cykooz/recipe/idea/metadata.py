@@ -0,0 +1,240 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import hashlib
+import os
+import re
+from typing import List, Optional
+
+from .snapshot import FsSnapshot, normalize_project_name
+from .utils import map_concurrently
+
+
+_REQUIREMENT_NAME_RE = re.compile(r'\s*([A-Za-z0-9][A-Za-z0-9._-]*)')
+_EXTRA_MARKER_RE = re.compile(r'\bextra\s*==')
+# Files of metadata of develop eggs that affect resolving of requirements
+_DEVELOP_METADATA_FILES = ('PKG-INFO', 'requires.txt')
+
+
+def find_metadata_dir(location: str, project_name: str) -> Optional[str]:
+    """Returns path of the metadata directory (``EGG-INFO``, ``*.egg-info``
+    or ``*.dist-info``) of the project installed into the location.
+    Returns ``None`` for zipped eggs and if metadata has not found.
+    """
+    egg_info = os.path.join(location, 'EGG-INFO')
+    if os.path.isdir(egg_info):
+        return egg_info
+    try:
+        names = os.listdir(location)
+    except OSError:
+        return None
+    key = normalize_project_name(project_name)
+    for name in sorted(names):
+        base, ext = os.path.splitext(name)
+        if ext not in ('.egg-info', '.dist-info'):
+            continue
+        # "<project>.egg-info" or "<project>-<version>[-<python>].dist-info"
+        if normalize_project_name(base.split('-')[0]) == key:
+            path = os.path.join(location, name)
+            if os.path.isdir(path):
+                return path
+    return None
+
+
+def read_metadata_file(location: str, project_name: str,
+                       file_name: str) -> Optional[str]:
+    """Returns content of the file from metadata of the project
+    or ``None`` if the file is absent. Zipped eggs are supported.
+    """
+    if os.path.isfile(location):
+        import zipfile
+        try:
+            with zipfile.ZipFile(location) as zip_file:
+                data = zip_file.read(f'EGG-INFO/{file_name}')
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+        return data.decode('utf-8', errors='replace')
+    metadata_dir = find_metadata_dir(location, project_name)
+    if not metadata_dir:
+        return None
+    try:
+        with open(os.path.join(metadata_dir, file_name), 'rt',
+                  encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def get_develop_eggs_state(snapshot: FsSnapshot, develop_eggs_dir: str) -> List[list]:
+    """Returns the state of develop eggs that doesn't change when buildout
+    re-runs ``setup.py develop`` without changes of projects - names of
+    entries of the directory, targets of egg-links and digests of content
+    of ``PKG-INFO`` and ``requires.txt`` of develop eggs. Modification
+    times are not used, because these files are rewritten on every run.
+    """
+    egg_links = snapshot.get_egg_links(develop_eggs_dir)
+    targets = snapshot.read_egg_links(egg_links.values())
+
+    def get_state(item) -> list:
+        key, link_path = item
+        target = targets.get(link_path)
+        digest = None
+        if target:
+            sha1 = hashlib.sha1()
+            for file_name in _DEVELOP_METADATA_FILES:
+                content = read_metadata_file(target, key, file_name)
+                sha1.update(f'{file_name}\n{content}\n'.encode('utf-8'))
+            digest = sha1.hexdigest()
+        return [key, target, digest]
+
+    return [
+        sorted(snapshot.listdir(develop_eggs_dir)),
+        map_concurrently(get_state, sorted(egg_links.items())),
+    ]
+
+
+def read_top_level(location: str, project_name: str) -> Optional[List[str]]:
+    """Returns names of top-level packages and modules of the project
+    from ``top_level.txt`` or from ``RECORD`` of wheels. Returns ``None``
+    if metadata has not these files.
+    """
+    content = read_metadata_file(location, project_name, 'top_level.txt')
+    if content is not None:
+        return [line.strip() for line in content.splitlines() if line.strip()]
+    content = read_metadata_file(location, project_name, 'RECORD')
+    if content is None:
+        return None
+    names = {}
+    for line in content.splitlines():
+        # Line has format "<path>,<hash>,<size>", path may be quoted
+        path = line.split(',')[0].strip('"')
+        top, sep, _ = path.partition('/')
+        name = _get_module_name(top, is_dir=bool(sep))
+        if name:
+            names[name] = None
+    return list(names)
+
+
+def list_top_level(location: str) -> Optional[List[str]]:
+    """Returns names of top-level packages and modules inside
+    of the directory or ``None`` if it is not a directory.
+    """
+    try:
+        names = os.listdir(location)
+    except OSError:
+        return None
+    result = {}
+    for name in sorted(names):
+        name = _get_module_name(name, os.path.isdir(os.path.join(location, name)))
+        if name:
+            result[name] = None
+    return list(result)
+
+
+def _get_module_name(file_name: str, is_dir: bool) -> Optional[str]:
+    """Returns name of the module or package by name of its file
+    or directory (``pkg``, ``mod.py``, ``ext.cpython-311-x86_64-linux-gnu.so``).
+    """
+    if is_dir:
+        name = file_name
+    else:
+        name, ext = os.path.splitext(file_name)
+        if ext not in ('.py', '.pyc', '.so', '.pyd'):
+            return None
+        name = name.split('.')[0]
+    if not name.isidentifier() or name == '__pycache__':
+        return None
+    return name
+
+
+def read_requires(location: str, project_name: str) -> List[str]:
+    """Returns normalized names of projects required by the project.
+    Requirements of extras are skipped.
+    """
+    content = read_metadata_file(location, project_name, 'requires.txt')
+    if content is not None:
+        return _parse_requires_txt(content)
+    content = read_metadata_file(location, project_name, 'METADATA')
+    if content is not None:
+        return _parse_metadata(content)
+    return []
+
+
+def read_requirements(location: str, project_name: str) -> List[str]:
+    """Returns requirements of the project in the format of
+    ``Requires-Dist``. Requirements of extras and of sections with
+    markers of ``requires.txt`` get the corresponding markers
+    (``extra == "name"``).
+    """
+    content = read_metadata_file(location, project_name, 'requires.txt')
+    if content is not None:
+        return _convert_requires_txt(content)
+    content = read_metadata_file(location, project_name, 'METADATA')
+    if content is None:
+        return []
+    requirements = []
+    for line in content.splitlines():
+        if not line.strip():
+            # End of headers
+            break
+        if line.startswith('Requires-Dist:'):
+            requirements.append(line[len('Requires-Dist:'):].strip())
+    return requirements
+
+
+def _convert_requires_txt(content: str) -> List[str]:
+    requirements = []
+    marker = ''
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('['):
+            # Section "[extra]", "[extra:marker]" or "[:marker]"
+            extra, _, section_marker = line.strip('[]').partition(':')
+            markers = []
+            if section_marker.strip():
+                markers.append(f'({section_marker.strip()})')
+            if extra.strip():
+                markers.append(f'extra == "{extra.strip()}"')
+            marker = ' and '.join(markers)
+            continue
+        requirements.append(f'{line}; {marker}' if marker else line)
+    return requirements
+
+
+def _parse_requires_txt(content: str) -> List[str]:
+    names = []
+    is_extra = False
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith('['):
+            # Section "[extra]" or "[extra:marker]", sections "[:marker]"
+            # contain requirements of the project itself.
+            is_extra = not line.startswith('[:')
+            continue
+        if is_extra:
+            continue
+        match = _REQUIREMENT_NAME_RE.match(line)
+        if match:
+            names.append(normalize_project_name(match.group(1)))
+    return names
+
+
+def _parse_metadata(content: str) -> List[str]:
+    names = []
+    for line in content.splitlines():
+        if not line.strip():
+            # End of headers
+            break
+        if not line.startswith('Requires-Dist:'):
+            continue
+        requirement = line[len('Requires-Dist:'):]
+        marker = requirement.partition(';')[2]
+        if _EXTRA_MARKER_RE.search(marker):
+            continue
+        match = _REQUIREMENT_NAME_RE.match(requirement)
+        if match:
+            names.append(normalize_project_name(match.group(1)))
+    return names
@@ -0,0 +1,158 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .utils import write_if_changed
+
+
+_PROMETHEUS_PREFIX = 'cykooz_recipe_idea'
+
+
+class Metrics:
+    """Durations of phases of the recipe run, numbers of roots
+    in libraries and statistics of written files.
+
+    Durations of phases with the same name are summed up.
+    Methods are thread-safe.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.roots: Dict[str, int] = {}
+        self.removed_roots = 0
+        self.writes: List[dict] = []
+        self.skipped = False
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_root(self, category: str):
+        with self._lock:
+            self.roots[category] = self.roots.get(category, 0) + 1
+
+    def add_removed_roots(self, count: int):
+        with self._lock:
+            self.removed_roots += count
+
+    def add_write(self, path: Path, size: int, written: bool):
+        with self._lock:
+            self.writes.append({
+                'path': str(path),
+                'bytes': size,
+                'written': written,
+            })
+
+    def get_report(self, part_name: str) -> dict:
+        with self._lock:
+            return {
+                'part': part_name,
+                'timestamp': time.time(),
+                'duration': time.perf_counter() - self._start,
+                'skipped': self.skipped,
+                'phases': dict(sorted(self.phases.items())),
+                'roots': dict(sorted(self.roots.items())),
+                'removed_roots': self.removed_roots,
+                'writes': sorted(self.writes, key=lambda w: w['path']),
+            }
+
+    def get_summary(self) -> str:
+        """Returns one-line description of durations of phases."""
+        phases = ', '.join(
+            f'{name} {seconds:.3f}s'
+            for name, seconds in sorted(self.phases.items())
+        )
+        return f'{time.perf_counter() - self._start:.3f}s ({phases})'
+
+    def save(self, part_name: str, json_path: Path,
+             prometheus_path: Optional[Path] = None):
+        report = self.get_report(part_name)
+        data = json.dumps(report, indent=1).encode('utf-8')
+        write_if_changed(json_path, data)
+        if prometheus_path:
+            data = render_prometheus(report).encode('utf-8')
+            write_if_changed(prometheus_path, data)
+
+
+def render_prometheus(report: dict) -> str:
+    """Returns the report in the text format of Prometheus
+    (for node_exporter's textfile collector).
+    """
+    part = _escape_label(report['part'])
+    writes = report['writes']
+    metrics = [
+        (
+            'duration_seconds', 'gauge',
+            'Duration of the last run of the recipe.',
+            [(f'part="{part}"', report['duration'])],
+        ),
+        (
+            'skipped', 'gauge',
+            'The last run has been skipped because inputs have not changed.',
+            [(f'part="{part}"', int(report['skipped']))],
+        ),
+        (
+            'phase_seconds', 'gauge',
+            'Duration of phases of the last run of the recipe.',
+            [
+                (f'part="{part}",phase="{_escape_label(name)}"', seconds)
+                for name, seconds in report['phases'].items()
+            ],
+        ),
+        (
+            'roots', 'gauge',
+            'Number of roots in libraries by categories.',
+            [
+                (f'part="{part}",category="{_escape_label(name)}"', count)
+                for name, count in report['roots'].items()
+            ],
+        ),
+        (
+            'removed_roots', 'gauge',
+            'Number of roots removed as aliases or overlapping with other roots.',
+            [(f'part="{part}"', report['removed_roots'])],
+        ),
+        (
+            'files', 'gauge',
+            'Number of files that have been written or skipped as unchanged.',
+            [
+                (f'part="{part}",written="true"', sum(w['written'] for w in writes)),
+                (f'part="{part}",written="false"', sum(not w['written'] for w in writes)),
+            ],
+        ),
+        (
+            'written_bytes', 'gauge',
+            'Number of bytes written by the last run of the recipe.',
+            [(f'part="{part}"', sum(w['bytes'] for w in writes if w['written']))],
+        ),
+    ]
+    lines = []
+    for name, metric_type, help_text, samples in metrics:
+        name = f'{_PROMETHEUS_PREFIX}_{name}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in samples:
+            lines.append(f'{name}{{{labels}}} {value}')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
@@ -0,0 +1,139 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+
+Index of top-level modules and packages of library roots.
+
+The index is a JSON file with the list of roots (in the order of
+``sys.path``) and the table of rows ``[module name, root number, project
+name]`` sorted by module name, so a module is found by binary search
+without importing of anything::
+
+    index = ModuleIndex.load('parts/idea/modules.json')
+    index.find('zope.interface.verify')
+"""
+import bisect
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .library import Entry
+from .metadata import find_metadata_dir, list_top_level, read_top_level
+from .utils import get_mtime, map_concurrently
+
+
+INDEX_VERSION = 1
+# Categories of roots that may contain distributions of several projects
+# (e.g. "site-packages").
+_SHARED_CATEGORIES = ('other', 'extra')
+
+
+class ModuleLocation(NamedTuple):
+    root: str
+    project: Optional[str]
+
+
+class ModuleIndex:
+
+    def __init__(self, roots: List[str], rows: List[list]):
+        self.roots = roots
+        self.rows = rows
+        self._names = [row[0] for row in rows]
+
+    @classmethod
+    def load(cls, path) -> 'ModuleIndex':
+        with open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f'Unsupported version of the module index {path}.')
+        return cls([root['path'] for root in data['roots']], data['index'])
+
+    def find(self, module_name: str) -> List[ModuleLocation]:
+        """Returns roots that contain the top-level module or package
+        of the given module. The first root has the highest priority.
+        """
+        name = module_name.split('.')[0]
+        start = bisect.bisect_left(self._names, name)
+        end = bisect.bisect_right(self._names, name, start)
+        return [
+            ModuleLocation(self.roots[root_no], project)
+            for _, root_no, project in self.rows[start:end]
+        ]
+
+
+def build_index(entries: List[Entry], data: Optional[bytes] = None) -> bytes:
+    """Returns content of the index of modules of given entries.
+    Modules of roots are taken from ``data`` of the previous index
+    if mtime of the root (and of its metadata) has not changed.
+    """
+    previous = _read_roots(data)
+
+    def get_root(entry: Entry) -> dict:
+        category, path, project_name = entry
+        path = str(path)
+        mtime = _get_mtime(path, project_name)
+        root = previous.get((path, project_name))
+        if root and root['mtime'] == mtime:
+            return root
+        return {
+            'path': path,
+            'project': project_name,
+            'mtime': mtime,
+            'modules': _get_modules(path, project_name, category),
+        }
+
+    roots = map_concurrently(get_root, entries)
+    rows = sorted(
+        (name, root_no, project)
+        for root_no, root in enumerate(roots)
+        for name, project in sorted(root['modules'].items())
+    )
+    content = {
+        'version': INDEX_VERSION,
+        'roots': roots,
+        'index': rows,
+    }
+    return json.dumps(content, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def _get_modules(path: str, project_name: Optional[str],
+                 category: str) -> Dict[str, Optional[str]]:
+    """Returns project names by names of top-level modules of the root."""
+    names = read_top_level(path, project_name) if project_name else None
+    if names is None:
+        return {name: project_name for name in list_top_level(path) or ()}
+    modules = {name: project_name for name in names if '/' not in name}
+    if category in _SHARED_CATEGORIES:
+        # Modules of other projects installed into the same directory
+        for name in list_top_level(path) or ():
+            modules.setdefault(name, None)
+    return modules
+
+
+def _get_mtime(path: str, project_name: Optional[str]) -> Optional[int]:
+    """Returns the latest mtime of the root and its metadata directory."""
+    mtime = get_mtime(path)
+    if mtime is None:
+        return None
+    if project_name and os.path.isdir(path):
+        metadata_dir = find_metadata_dir(path, project_name)
+        metadata_mtime = get_mtime(metadata_dir) if metadata_dir else None
+        if metadata_mtime is not None:
+            mtime = max(mtime, metadata_mtime)
+    return mtime
+
+
+def _read_roots(data: Optional[bytes]) -> Dict[Tuple[str, Optional[str]], dict]:
+    if not data:
+        return {}
+    try:
+        content = json.loads(data.decode('utf-8'))
+    except ValueError:
+        return {}
+    if not isinstance(content, dict) or content.get('version') != INDEX_VERSION:
+        return {}
+    return {
+        (root['path'], root['project']): root
+        for root in content.get('roots', ())
+        if isinstance(root, dict) and 'path' in root
+    }
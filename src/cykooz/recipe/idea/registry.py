@@ -0,0 +1,67 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .utils import read_json_dict, write_if_changed
+
+
+class LibraryRegistry:
+    """Registry of application-level libraries added by the recipe into
+    configuration files of IDE. It is shared between buildouts and stores
+    the name of library used by every part (by path of its directory)
+    and names of libraries added into every configuration file.
+
+    A library is unused if no registered part refers to it. Parts whose
+    directories have removed (e.g. with the whole checkout) are forgotten.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def update(self, part_dir: str, name: Optional[str],
+               library_files: Iterable[str]) -> Dict[str, List[str]]:
+        """Registers the library used by the part (``None`` - the part
+        doesn't use any library) and the library as added into given
+        configuration files. Returns names of unused libraries by paths
+        of configuration files. Returned libraries are forgotten, so
+        the caller must remove them from files.
+        """
+        data = read_json_dict(self.path)
+        projects = data.get('projects')
+        if not isinstance(projects, dict):
+            projects = {}
+        libraries = data.get('libraries')
+        if not isinstance(libraries, dict):
+            libraries = {}
+
+        projects = {
+            path: library_name
+            for path, library_name in projects.items()
+            if path != part_dir and os.path.isdir(path)
+        }
+        if name is not None:
+            projects[part_dir] = name
+        used = set(projects.values())
+
+        unused = {}
+        for file_path in library_files:
+            names = set(libraries.get(file_path, ()))
+            if name is not None:
+                names.add(name)
+            unused_names = sorted(names - used)
+            if unused_names:
+                unused[file_path] = unused_names
+            libraries[file_path] = sorted(names & used)
+        libraries = {path: names for path, names in libraries.items() if names}
+
+        content = {'projects': projects, 'libraries': libraries}
+        write_if_changed(
+            self.path,
+            json.dumps(content, indent=1, sort_keys=True).encode('utf-8'),
+        )
+        return unused
@@ -0,0 +1,354 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import pkg_resources
+from zc.buildout import UserError
+from zc.buildout.buildout import bool_option
+from zc.buildout.easy_install import default_versions
+
+from .metadata import get_develop_eggs_state, read_requirements
+from .snapshot import FsSnapshot, normalize_project_name
+from .utils import get_mtime, read_json_dict, write_if_changed
+
+
+class ResolvedDist(NamedTuple):
+    project_name: str
+    location: str
+
+
+Resolution = Tuple[ResolvedDist, ...]
+
+
+class ResolutionKey(NamedTuple):
+    requirements: Tuple[tuple, ...]
+    eggs_dir: str
+    develop_eggs_dir: str
+    offline: bool
+    newest: bool
+    links: Tuple[str, ...]
+    index: Optional[str]
+    allow_hosts: Tuple[str, ...]
+    allow_unknown_extras: bool
+    versions: Tuple[Tuple[str, str], ...]
+
+
+# Working sets resolved in the current process
+_resolutions: Dict[ResolutionKey, Resolution] = {}
+
+# Name of attribute of Buildout instance that is used
+# by zc.recipe.egg to cache resolved working sets.
+_ZC_RECIPE_EGG_CACHE_ATTR_NAME = '_zc_recipe_egg_working_set_cache'
+
+
+def resolve(eggs, logger: logging.Logger, cache_path: Path = None,
+            snapshot: FsSnapshot = None, by_pins: bool = False) -> Resolution:
+    """Returns distributions of working set of given
+    ``zc.recipe.egg.Eggs`` instance.
+
+    Working set is resolved only if it hasn't been resolved before
+    in the current process - by this or by any other part that uses
+    ``zc.recipe.egg``. If ``cache_path`` is given, the result of resolving
+    is stored into this file and reused by next runs while all
+    distributions are present on the disk. If ``by_pins`` is true,
+    the working set is resolved by :func:`resolve_by_pins`.
+    """
+    requirements = _get_requirements(eggs)
+    key = get_resolution_key(eggs, requirements)
+    resolution = _resolutions.get(key)
+    if resolution is not None:
+        logger.debug('Working set has been already resolved by this recipe.')
+        return resolution
+
+    if by_pins:
+        resolution = resolve_by_pins(
+            requirements,
+            dict(key.versions),
+            key.eggs_dir,
+            key.develop_eggs_dir,
+            snapshot or FsSnapshot(),
+        )
+        logger.debug('Working set has been resolved by pinned versions.')
+        _resolutions[key] = resolution
+        return resolution
+
+    disk_key = None
+    snapshot = snapshot or FsSnapshot()
+    if cache_path:
+        disk_key = _get_disk_cache_key(key, snapshot)
+        resolution = _read_disk_cache(cache_path, disk_key)
+        if resolution is not None:
+            logger.debug(f'Working set has been loaded from cache ({cache_path}).')
+            _resolutions[key] = resolution
+            return resolution
+        logger.debug(f'Cache of working set ({cache_path}) is outdated.')
+
+    ws = _find_zc_recipe_egg_working_set(eggs.buildout, key)
+    if ws is not None:
+        logger.debug('Working set has been already resolved by other part.')
+    else:
+        _, ws = eggs.working_set()
+
+    resolution = tuple(
+        ResolvedDist(dist.project_name, dist.location)
+        for dist in ws
+    )
+    _resolutions[key] = resolution
+    if cache_path:
+        develop_eggs_dir = key.develop_eggs_dir
+        develop_paths = {
+            os.path.normpath(target)
+            for target in snapshot.read_egg_links(
+                snapshot.get_egg_links(develop_eggs_dir).values()
+            ).values()
+            if target
+        }
+        _write_disk_cache(cache_path, disk_key, resolution, develop_paths)
+    return resolution
+
+
+def resolve_by_pins(requirements: Iterable[str], versions: Dict[str, str],
+                    eggs_dir: str, develop_eggs_dir: str,
+                    snapshot: FsSnapshot) -> Resolution:
+    """Returns distributions of the closure of requirements without
+    contacting of any index. Every required project must be a develop egg
+    or must have a pinned version whose egg is present in the eggs
+    directory. Requirements of eggs are read from their metadata
+    (``requires.txt`` or ``METADATA``), zipped eggs are supported.
+
+    Develop eggs go first, like in working sets of ``zc.recipe.egg``.
+    """
+    pins = {normalize_project_name(name): v for name, v in versions.items()}
+    develop_links = snapshot.get_egg_links(develop_eggs_dir)
+    develop_targets = snapshot.read_egg_links(develop_links.values())
+    eggs = _list_eggs(snapshot, eggs_dir)
+
+    develop_dists: List[ResolvedDist] = []
+    egg_dists: List[ResolvedDist] = []
+    locations: Dict[str, str] = {}
+    # Requirements of projects and their extras that are already added
+    processed = set()
+    queue = deque((requirement, None) for requirement in requirements)
+    while queue:
+        requirement, required_by = queue.popleft()
+        try:
+            req = pkg_resources.Requirement.parse(requirement)
+        except ValueError as e:
+            raise UserError(f'Invalid requirement "{requirement}": {e}')
+        extra = required_by[1] if required_by else ''
+        if req.marker and not req.marker.evaluate({'extra': extra}):
+            continue
+        key = normalize_project_name(req.project_name)
+        location = locations.get(key)
+        if location is None:
+            location = _find_pinned_location(
+                req, key, pins, eggs, develop_links, develop_targets, required_by,
+            )
+            locations[key] = location
+            dists = develop_dists if key in develop_links else egg_dists
+            dists.append(ResolvedDist(req.project_name, location))
+        for extra in ('', *req.extras):
+            if (key, extra) in processed:
+                continue
+            processed.add((key, extra))
+            queue.extend(
+                (r, (req.project_name, extra))
+                for r in read_requirements(location, req.project_name)
+            )
+    return tuple(develop_dists + egg_dists)
+
+
+def _find_pinned_location(req, key: str, pins: Dict[str, str],
+                          eggs: Dict[str, Dict[str, str]],
+                          develop_links: Dict[str, str],
+                          develop_targets: Dict[str, str],
+                          required_by: Optional[Tuple[str, str]]) -> str:
+    source = f' (required by {required_by[0]})' if required_by else ''
+    if key in develop_links:
+        target = develop_targets.get(develop_links[key])
+        if not target:
+            raise UserError(
+                f'Egg-link of develop egg {req.project_name}{source} is empty.'
+            )
+        return target
+    version = pins.get(key)
+    if version is None:
+        raise UserError(
+            f'Version of {req.project_name}{source} is not pinned. '
+            f'All eggs must be pinned if option "resolver" is "pins".'
+        )
+    # Explicit pins of pre-releases are allowed, like in buildout
+    if not req.specifier.contains(version, prereleases=True):
+        raise UserError(
+            f'Pinned version {version} of {req.project_name} '
+            f'does not match requirement "{req}"{source}.'
+        )
+    location = eggs.get(key, {}).get(_normalize_version(version))
+    if location is None:
+        raise UserError(
+            f'Egg {req.project_name}=={version}{source} has not found '
+            f'in the eggs directory. Run buildout with the default resolver '
+            f'to install it.'
+        )
+    return location
+
+
+def _list_eggs(snapshot: FsSnapshot, eggs_dir: str) -> Dict[str, Dict[str, str]]:
+    """Returns paths of eggs compatible with the current Python
+    by normalized names of projects and normalized versions.
+    """
+    python_tag = f'py{sys.version_info[0]}.{sys.version_info[1]}'
+    eggs = {}
+    for name, entry in snapshot.listdir(eggs_dir).items():
+        if not name.endswith('.egg'):
+            continue
+        # "<project>-<version>-py<X.Y>[-<platform>].egg"
+        parts = name[:-len('.egg')].split('-')
+        if len(parts) < 3 or parts[2] != python_tag:
+            continue
+        version = _normalize_version(parts[1].replace('_', '-'))
+        eggs.setdefault(normalize_project_name(parts[0]), {})[version] = entry.path
+    return eggs
+
+
+def _normalize_version(version: str) -> str:
+    return str(pkg_resources.parse_version(version))
+
+
+def clear_cache():
+    _resolutions.clear()
+
+
+def get_resolution_key(eggs, requirements: Iterable[str]) -> ResolutionKey:
+    """Returns the key that identifies the result of resolving.
+    It uses the same arguments as ``zc.recipe.egg.Eggs.working_set()``.
+    """
+    options = eggs.options
+    buildout_section = eggs.buildout['buildout']
+    return ResolutionKey(
+        requirements=normalize_requirements(requirements),
+        eggs_dir=options['eggs-directory'],
+        develop_eggs_dir=options['develop-eggs-directory'],
+        offline=buildout_section.get('offline') == 'true',
+        newest=buildout_section.get('newest') == 'true',
+        links=tuple(eggs.links),
+        index=eggs.index,
+        allow_hosts=tuple(eggs.allow_hosts),
+        allow_unknown_extras=bool_option(buildout_section, 'allow-unknown-extras'),
+        versions=tuple(sorted(default_versions().items())),
+    )
+
+
+def normalize_requirements(requirements: Iterable[str]) -> Tuple[tuple, ...]:
+    """Returns sorted unique requirements that don't depend
+    on a case of names, order of extras and formatting.
+    """
+    result = set()
+    for requirement in requirements:
+        try:
+            req = pkg_resources.Requirement.parse(requirement)
+        except ValueError:
+            result.add((requirement.strip().lower(),))
+            continue
+        result.add((
+            req.key,
+            tuple(sorted(req.extras)),
+            str(req.specifier),
+            str(req.marker or ''),
+        ))
+    return tuple(sorted(result))
+
+
+def _get_requirements(eggs):
+    return [
+        r.strip()
+        for r in eggs.options.get('eggs', eggs.name).split('\n')
+        if r.strip()
+    ]
+
+
+def _get_disk_cache_key(key: ResolutionKey, snapshot: FsSnapshot) -> str:
+    """Returns a digest of the resolution key and of the state of develop
+    eggs (targets of egg-links and their metadata). Modification times
+    of egg-links are not used, because buildout re-creates them on every
+    run.
+    """
+    develop_eggs = get_develop_eggs_state(snapshot, key.develop_eggs_dir)
+    data = json.dumps([key, develop_eggs]).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def _read_disk_cache(path: Path, disk_key: str) -> Optional[Resolution]:
+    """Returns the resolution from the cache file if it has the given key
+    and all its distributions still are on the disk. Distributions
+    without mtime are develop eggs - they are checked by existence only,
+    their locations are working copies that change all the time.
+    """
+    data = read_json_dict(path)
+    if data.get('key') != disk_key:
+        return None
+    resolution = []
+    for name, location, mtime in data.get('dists', ()):
+        if mtime is None:
+            if not os.path.exists(location):
+                return None
+        elif get_mtime(location) != mtime:
+            return None
+        resolution.append(ResolvedDist(name, location))
+    return tuple(resolution)
+
+
+def _write_disk_cache(path: Path, disk_key: str, resolution: Resolution,
+                      develop_paths: Set[str]):
+    dists = []
+    for name, location in resolution:
+        mtime = get_mtime(location)
+        if mtime is None:
+            # Distribution without location on the disk
+            # can't be validated - don't cache the resolution.
+            return
+        if os.path.normpath(location) in develop_paths:
+            mtime = None
+        dists.append((name, location, mtime))
+    data = json.dumps({'key': disk_key, 'dists': dists}, indent=1)
+    write_if_changed(path, data.encode('utf-8'))
+
+
+def _find_zc_recipe_egg_working_set(buildout, key: ResolutionKey):
+    """Returns a working set with the same key from cache
+    of ``zc.recipe.egg``.
+    """
+    cache = getattr(buildout, _ZC_RECIPE_EGG_CACHE_ATTR_NAME, None)
+    if not cache:
+        return None
+    for cache_key, ws in cache.items():
+        try:
+            (
+                distributions, eggs_dir, develop_eggs_dir, offline, newest,
+                links, index, allow_hosts, allow_unknown_extras,
+            ) = cache_key
+        except ValueError:
+            # Unknown format of the key
+            return None
+        if (
+            eggs_dir == key.eggs_dir
+            and develop_eggs_dir == key.develop_eggs_dir
+            and offline == key.offline
+            and newest == key.newest
+            and tuple(links) == key.links
+            and index == key.index
+            and tuple(allow_hosts) == key.allow_hosts
+            and allow_unknown_extras == key.allow_unknown_extras
+            and normalize_requirements(distributions) == key.requirements
+        ):
+            return ws
+    return None
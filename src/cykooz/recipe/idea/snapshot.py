@@ -0,0 +1,148 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import fnmatch
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from .utils import MAX_WORKERS, map_concurrently
+
+
+class FsSnapshot:
+    """Snapshot of file system metadata that is built once per run
+    of the recipe.
+
+    Every directory is scanned by ``os.scandir()`` only once, metadata
+    of its entries is taken from this scan. Stat-calls are made lazily
+    and cached by ``os.DirEntry`` instances.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.max_workers = max_workers
+        self._dirs: Dict[str, Optional[Dict[str, os.DirEntry]]] = {}
+        self._egg_links: Dict[str, str] = {}
+        self._realpaths: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def listdir(self, path) -> Dict[str, os.DirEntry]:
+        """Returns entries of the directory by their names.
+        Returns an empty dict if the directory doesn't exist.
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            entries = self._dirs.get(path, False)
+        if entries is False:
+            try:
+                with os.scandir(path) as it:
+                    entries = {entry.name: entry for entry in it}
+            except OSError:
+                entries = None
+            with self._lock:
+                self._dirs[path] = entries
+        return entries or {}
+
+    def get_entry(self, path) -> Optional[os.DirEntry]:
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        if not name:
+            return None
+        return self.listdir(parent).get(name)
+
+    def exists(self, path) -> bool:
+        return self.get_entry(path) is not None
+
+    def is_dir(self, path) -> bool:
+        entry = self.get_entry(path)
+        return entry is not None and entry.is_dir()
+
+    def get_mtime(self, path) -> Optional[int]:
+        entry = self.get_entry(path)
+        try:
+            return entry.stat().st_mtime_ns if entry else None
+        except OSError:
+            return None
+
+    def get_size(self, path) -> Optional[int]:
+        entry = self.get_entry(path)
+        try:
+            return entry.stat().st_size if entry else None
+        except OSError:
+            return None
+
+    def realpath(self, path) -> str:
+        """Returns the canonical absolute path without symbolic links.
+        Only components that are symbolic links are resolved by
+        ``os.path.realpath()``, other ones are taken from scans
+        of parent directories. Results are cached.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            result = self._realpaths.get(path)
+        if result is None:
+            parent, name = os.path.split(path)
+            entry = self.get_entry(path) if name else None
+            if not name:
+                result = path
+            elif entry is not None and entry.is_symlink():
+                result = os.path.realpath(path)
+            else:
+                result = os.path.join(self.realpath(parent), name)
+            with self._lock:
+                self._realpaths[path] = result
+        return result
+
+    def glob(self, path, pattern: str) -> List[str]:
+        """Returns sorted paths of entries of the directory
+        which names are matched with the pattern.
+        """
+        path = os.path.normpath(path)
+        names = fnmatch.filter(self.listdir(path), pattern)
+        return [os.path.join(path, name) for name in sorted(names)]
+
+    def get_egg_links(self, path) -> Dict[str, str]:
+        """Returns paths of egg-link files from the directory
+        by normalized names of projects.
+        """
+        return {
+            normalize_project_name(name[:-len('.egg-link')]): entry.path
+            for name, entry in self.listdir(path).items()
+            if name.endswith('.egg-link')
+        }
+
+    def read_egg_links(self, paths: Iterable[str]) -> Dict[str, str]:
+        """Reads egg-link files concurrently and returns normalized paths
+        of their targets by paths of egg-link files.
+        """
+        with self._lock:
+            paths = [p for p in paths if p not in self._egg_links]
+        targets = map_concurrently(_read_egg_link, paths, self.max_workers)
+        with self._lock:
+            self._egg_links.update(zip(paths, targets))
+            return dict(self._egg_links)
+
+    def invalidate(self, path=None):
+        """Forgets the cached content of the directory
+        (or of all directories).
+        """
+        with self._lock:
+            self._realpaths.clear()
+            if path is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(os.path.normpath(path), None)
+
+
+def normalize_project_name(name: str) -> str:
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+
+def _read_egg_link(path: str) -> str:
+    try:
+        with open(path, 'rt') as f:
+            target = f.readline().strip()
+    except OSError:
+        return ''
+    return os.path.normpath(target) if target else ''
@@ -0,0 +1,143 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+
+Generator of ``.pyi`` stubs of compiled modules by introspection.
+
+This file is executed as a script in a separate isolated process
+(``python -I stubgen.py``), so it must not import anything from
+the package. Parameters are read from stdin as JSON object with keys
+``paths`` (items of ``sys.path``), ``modules`` (names of modules),
+``output`` (directory for stubs) and ``progress`` (path of the progress
+file). Modules print anything to stdout on import, so progress is
+written into the file instead, one line per event: ``+name`` before
+importing of a module, ``=name`` after writing of its stub and ``-name``
+if the module has failed to import. A module that crashes the process
+is the one that has ``+name`` line only.
+"""
+import builtins
+import inspect
+import json
+import os
+import sys
+
+
+_BUILTIN_TYPES = (bool, int, float, complex, str, bytes, list, tuple, dict, set)
+
+
+def main():
+    params = json.load(sys.stdin)
+    sys.path[0:0] = params['paths']
+    with open(params['progress'], 'at', encoding='utf-8') as progress:
+
+        def report(event: str, module_name: str):
+            progress.write(f'{event}{module_name}\n')
+            progress.flush()
+
+        for module_name in params['modules']:
+            report('+', module_name)
+            try:
+                module = __import__(module_name, fromlist=['_'])
+                content = render_module(module)
+            except BaseException:  # noqa - any error of foreign module
+                report('-', module_name)
+                continue
+            path = os.path.join(params['output'], *module_name.split('.')) + '.pyi'
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wt', encoding='utf-8') as f:
+                f.write(content)
+            report('=', module_name)
+
+
+def render_module(module) -> str:
+    lines = ['from typing import Any', '']
+    for name, value in sorted(vars(module).items()):
+        if name.startswith('__') or inspect.ismodule(value):
+            continue
+        if inspect.isclass(value):
+            if value.__module__ == module.__name__:
+                lines.extend(render_class(name, value))
+            continue
+        if callable(value):
+            lines.append(f'def {name}{get_signature(value)} -> Any: ...')
+        else:
+            lines.append(f'{name}: {get_type_name(value)}')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def render_class(name: str, cls) -> list:
+    bases = [
+        base.__name__ for base in cls.__bases__
+        if base is not object and getattr(builtins, base.__name__, None) is base
+    ]
+    header = f'class {name}({", ".join(bases)}):' if bases else f'class {name}:'
+    lines = [header]
+    body = []
+    for attr_name, value in sorted(vars(cls).items()):
+        if attr_name.startswith('__') and attr_name not in ('__init__', '__call__'):
+            continue
+        if isinstance(value, staticmethod):
+            body.append('@staticmethod')
+            value = value.__func__
+            signature = get_signature(value)
+        elif isinstance(value, classmethod):
+            body.append('@classmethod')
+            signature = get_signature(value.__func__, 'cls')
+        elif inspect.isclass(value):
+            # Body of the class is indented below
+            body.extend(render_class(attr_name, value))
+            continue
+        elif callable(value):
+            signature = get_signature(value, 'self')
+        else:
+            body.append(f'{attr_name}: {get_type_name(value)}')
+            continue
+        body.append(f'def {attr_name}{signature} -> Any: ...')
+    if not body:
+        body = ['...']
+    lines.extend(f'    {line}' for line in body)
+    return lines
+
+
+def get_signature(func, first_arg: str = None) -> str:
+    """Returns signature without annotations and with ``...``
+    instead of default values.
+    """
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
+        return f'({first_arg}, *args, **kwargs)' if first_arg else '(*args, **kwargs)'
+    params = []
+    has_keyword_only_marker = False
+    parameters = list(signature.parameters.values())
+    if first_arg and (not parameters or parameters[0].name not in ('self', 'cls')):
+        params.append(first_arg)
+    for i, param in enumerate(parameters):
+        kind = param.kind
+        if kind == param.VAR_POSITIONAL:
+            params.append(f'*{param.name}')
+            has_keyword_only_marker = True
+        elif kind == param.VAR_KEYWORD:
+            params.append(f'**{param.name}')
+        else:
+            if kind == param.KEYWORD_ONLY and not has_keyword_only_marker:
+                params.append('*')
+                has_keyword_only_marker = True
+            default = '=...' if param.default is not param.empty else ''
+            params.append(f'{param.name}{default}')
+        next_kind = parameters[i + 1].kind if i + 1 < len(parameters) else None
+        if kind == param.POSITIONAL_ONLY and next_kind != param.POSITIONAL_ONLY:
+            params.append('/')
+    return f'({", ".join(params)})'
+
+
+def get_type_name(value) -> str:
+    value_type = type(value)
+    if value_type in _BUILTIN_TYPES or value is None:
+        return 'None' if value is None else value_type.__name__
+    return 'Any'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .utils import get_stat, map_concurrently, read_json_dict, write_if_changed
+
+
+# Suffixes of files of compiled modules
+BINARY_SUFFIXES = ('.so', '.pyd')
+_DONE_FILE = '.done'
+_PROGRESS_FILE = '.progress'
+_SKIPPED_DIRS = ('__pycache__', 'EGG-INFO')
+DEFAULT_TIMEOUT = 120
+
+
+class StubsCache:
+    """Cache of ``.pyi`` stubs of compiled modules that is shared
+    between buildouts. Stubs of an egg are generated into the directory
+    ``<cache dir>/<digest>``, where digest is SHA256 of the path of
+    the egg, content of its compiled modules and the version of Python.
+
+    Stubs are generated by introspection of modules in separate isolated
+    processes (``python -I``) with a timeout, so crashes or hangs of
+    compiled modules don't affect the recipe.
+    """
+
+    def __init__(self, cache_dir: Path, memo_path: Path,
+                 logger: logging.Logger, timeout: float = DEFAULT_TIMEOUT):
+        self.cache_dir = cache_dir
+        self.memo_path = memo_path
+        self.logger = logger
+        self.timeout = timeout
+
+    def get_dirs(self, egg_paths: Iterable[str],
+                 sys_path: Sequence[str]) -> Dict[str, str]:
+        """Returns directories with stubs by paths of eggs that contain
+        compiled modules. ``sys_path`` is used to import dependencies
+        of compiled modules.
+        """
+        memo = self._read_memo()
+        new_memo = {}
+
+        def get_dir(egg_path: str) -> Optional[str]:
+            modules = find_binary_modules(egg_path)
+            if not modules:
+                return None
+            signature = [[path, get_stat(path)] for path in sorted(modules.values())]
+            entry = memo.get(egg_path)
+            if entry and entry[0] == signature:
+                digest = entry[1]
+            else:
+                digest = _get_digest(egg_path, modules)
+            stubs_dir = self.cache_dir / digest
+            if not (stubs_dir / _DONE_FILE).exists():
+                if not self._generate(stubs_dir, sorted(modules), [egg_path, *sys_path]):
+                    return None
+            new_memo[egg_path] = [signature, digest]
+            return str(stubs_dir)
+
+        egg_paths = list(egg_paths)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        dirs = map_concurrently(get_dir, egg_paths)
+        write_if_changed(
+            self.memo_path,
+            json.dumps(new_memo, indent=1, sort_keys=True).encode('utf-8'),
+        )
+        return {
+            egg_path: stubs_dir
+            for egg_path, stubs_dir in zip(egg_paths, dirs)
+            if stubs_dir
+        }
+
+    def get_cached_dirs(self) -> List[str]:
+        """Returns directories with stubs remembered by the last run."""
+        return [
+            str(self.cache_dir / digest)
+            for _, digest in sorted(self._read_memo().values(), key=lambda e: e[1])
+        ]
+
+    def _generate(self, stubs_dir: Path, module_names: List[str],
+                  sys_path: List[str]) -> bool:
+        """Generates stubs of modules and returns ``True`` if stubs
+        have been added into the cache.
+
+        A module that crashes the process is skipped and the process is
+        restarted for the rest of modules. Stubs are not added into the
+        cache if the process has hung or has failed by other reasons,
+        so they will be generated again by the next run.
+        """
+        # Stubs are generated into a temporary directory which then
+        # is renamed, so other processes never see partial stubs.
+        tmp_dir = stubs_dir.with_name(f'{stubs_dir.name}.{uuid.uuid4().hex}.tmp')
+        tmp_dir.mkdir()
+        progress_path = tmp_dir / _PROGRESS_FILE
+        written = []
+        failed = []
+        pending = list(module_names)
+        try:
+            while pending:
+                progress_path.write_text('')
+                params = {
+                    'paths': sys_path,
+                    'modules': pending,
+                    'output': str(tmp_dir),
+                    'progress': str(progress_path),
+                }
+                result = subprocess.run(
+                    [sys.executable, '-I', str(Path(__file__).with_name('stubgen.py'))],
+                    input=json.dumps(params),
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    timeout=self.timeout,
+                    cwd=str(tmp_dir),
+                    env=_get_sandbox_env(),
+                )
+                started, done, errors = _read_progress(progress_path)
+                written.extend(done)
+                failed.extend(errors)
+                crashed = [name for name in started if name not in done + errors]
+                if result.returncode != 0 and crashed:
+                    self.logger.debug(
+                        f'Module {crashed[0]} has crashed the process of '
+                        f'generating of stubs: {result.stderr.strip()[-500:]}'
+                    )
+                    failed.append(crashed[0])
+                elif result.returncode != 0 or crashed:
+                    raise OSError(
+                        f'process has exited with code {result.returncode} '
+                        f'({result.stderr.strip()[-500:]})'
+                    )
+                elif len(started) < len(pending):
+                    raise OSError('process has not processed all modules')
+                pending = pending[len(started):]
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self.logger.warning(f'Failed to generate stubs of {module_names}: {e}')
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+        progress_path.unlink()
+        for name in {module_name.split('.')[0] for module_name in written}:
+            if os.path.isdir(tmp_dir / name):
+                # Stubs are partial - other modules of packages
+                # are taken from the egg (PEP 561).
+                (tmp_dir / name / 'py.typed').write_text('partial\n')
+        (tmp_dir / _DONE_FILE).write_text('\n'.join(written))
+        try:
+            os.rename(tmp_dir, stubs_dir)
+        except OSError:
+            # Stubs have been generated by another process
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.logger.debug(
+            f'Stubs of {len(written)} compiled modules have generated'
+            + (f', {len(failed)} modules have failed to import.' if failed else '.')
+        )
+        return True
+
+    def _read_memo(self) -> Dict[str, list]:
+        return read_json_dict(self.memo_path)
+
+
+def find_binary_modules(egg_path: str) -> Dict[str, str]:
+    """Returns paths of compiled modules inside of the directory
+    by names of modules.
+    """
+    modules = {}
+    for dir_path, dir_names, file_names in os.walk(egg_path):
+        dir_names[:] = [
+            name for name in dir_names
+            if name not in _SKIPPED_DIRS and name.isidentifier()
+        ]
+        rel_dir = os.path.relpath(dir_path, egg_path)
+        package = [] if rel_dir == '.' else rel_dir.split(os.sep)
+        for file_name in file_names:
+            if not file_name.endswith(BINARY_SUFFIXES):
+                continue
+            # "name.cpython-311-x86_64-linux-gnu.so" or "name.pyd"
+            name = file_name.split('.')[0]
+            if name.isidentifier():
+                modules['.'.join([*package, name])] = os.path.join(dir_path, file_name)
+    return modules
+
+
+def _read_progress(path: Path) -> Tuple[List[str], List[str], List[str]]:
+    """Returns names of started, written and failed modules
+    from the progress file of ``stubgen.py``.
+    """
+    events = {'+': [], '=': [], '-': []}
+    with path.open('rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line and line[0] in events:
+                events[line[0]].append(line[1:])
+    return events['+'], events['='], events['-']
+
+
+def _get_digest(egg_path: str, modules: Dict[str, str]) -> str:
+    sha256 = hashlib.sha256()
+    sha256.update(f'{egg_path}\n{sys.implementation.cache_tag}\n'.encode('utf-8'))
+    for name, path in sorted(modules.items()):
+        sha256.update(f'{name}\n'.encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _get_sandbox_env() -> Dict[str, str]:
+    """Returns minimal environment for processes that import
+    foreign compiled modules.
+    """
+    keys = ('PATH', 'SYSTEMROOT', 'LD_LIBRARY_PATH', 'DYLD_LIBRARY_PATH')
+    return {key: os.environ[key] for key in keys if key in os.environ}
@@ -0,0 +1,290 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import argparse
+import ast
+import logging
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import zc.buildout.configparser
+from zc.buildout import UserError
+
+from . import INSTALLED_DIRS, Recipe
+from .resolution import Resolution, ResolvedDist
+from .snapshot import FsSnapshot, normalize_project_name
+
+
+RECIPE_NAME = 'cykooz.recipe.idea'
+
+# Replacements that zc.buildout uses to store leading and trailing
+# whitespaces of values in ".installed.cfg".
+_SPACEY_DEFAULTS = (
+    ('%(__buildout_space__)s', ' '),
+    ('%(__buildout_space_n__)s', '\n'),
+    ('%(__buildout_space_r__)s', '\r'),
+    ('%(__buildout_space_f__)s', '\f'),
+    ('%(__buildout_space_v__)s', '\v'),
+)
+_SYS_PATH_RE = re.compile(r'sys\.path\[0:0\]\s*=\s*\[(.*?)\]', re.DOTALL)
+_SYS_PATH_ITEM_RE = re.compile(
+    r'''(join\(base,\s*)?('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")'''
+)
+_MAX_SCRIPT_SIZE = 1024 * 1024
+
+
+def main(argv: Sequence[str] = None) -> int:
+    """Entry point of the command ``idea_sync`` that regenerates libraries
+    of Idea projects from data of the last run of buildout.
+    """
+    parser = argparse.ArgumentParser(
+        prog='idea_sync',
+        description='Regenerates libraries of Idea projects from '
+                    '".installed.cfg" and scripts of buildout '
+                    'without running of buildout.',
+    )
+    parser.add_argument(
+        '-d', '--directory', default='.',
+        help='Directory of the buildout (default: current directory).',
+    )
+    parser.add_argument(
+        '-i', '--installed',
+        help='Path to the file with installed parts '
+             '(default: <directory>/.installed.cfg).',
+    )
+    parser.add_argument(
+        '-w', '--watch', action='store_true',
+        help='Keep running and update libraries after changes of eggs, '
+             'develop eggs, scripts and extra paths (Linux only).',
+    )
+    parser.add_argument(
+        '--debounce', type=float, default=0.5,
+        help='Seconds without changes to wait before updating '
+             'in the watch mode (default: 0.5).',
+    )
+    parser.add_argument(
+        '-v', '--verbose', action='store_true',
+        help='Show debug messages.',
+    )
+    parser.add_argument(
+        'parts', nargs='*',
+        help='Names of parts to regenerate (default: all parts of the recipe).',
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(name)s: %(message)s',
+    )
+    try:
+        if args.watch:
+            from .watch import watch
+            watch(Path(args.directory), args.installed, args.parts, args.debounce)
+        else:
+            sync(Path(args.directory), args.installed, args.parts)
+    except UserError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def sync(buildout_dir: Path, installed_path=None,
+         part_names: Sequence[str] = ()) -> List[str]:
+    """Regenerates libraries of installed parts of the recipe.
+    Returns names of regenerated parts.
+    """
+    names = []
+    for recipe in get_sync_recipes(buildout_dir, installed_path, part_names):
+        targets = recipe._get_targets()
+        if recipe._get_active_emitters(targets):
+            recipe._update_targets(targets)
+        recipe._save_metrics()
+        names.append(recipe.name)
+    return names
+
+
+def get_sync_recipes(buildout_dir: Path, installed_path=None,
+                     part_names: Sequence[str] = ()) -> List['SyncRecipe']:
+    """Returns recipes of installed parts that take working sets
+    from scripts of buildout.
+    """
+    buildout_dir = buildout_dir.absolute()
+    installed_path = Path(installed_path or buildout_dir / '.installed.cfg')
+    parts = read_installed_parts(installed_path)
+    if part_names:
+        unknown = [name for name in part_names if name not in parts]
+        if unknown:
+            raise UserError(
+                f'Parts {", ".join(unknown)} of the recipe {RECIPE_NAME} '
+                f'have not installed.'
+            )
+        parts = {name: parts[name] for name in part_names}
+    if not parts:
+        raise UserError(f'Parts of the recipe {RECIPE_NAME} have not installed.')
+
+    recipes = []
+    for name, options in parts.items():
+        missing = [key for key in INSTALLED_DIRS if key not in options]
+        if missing:
+            raise UserError(
+                f'Part {name} has installed by an old version of the recipe. '
+                f'Run buildout once to record options required by idea_sync.'
+            )
+        recipes.append(SyncRecipe(buildout_dir, name, options))
+    return recipes
+
+
+def read_installed_parts(path: Path) -> Dict[str, Dict[str, str]]:
+    """Returns recorded options of installed parts of the recipe."""
+    try:
+        with path.open('rt') as f:
+            sections = zc.buildout.configparser.parse(f, str(path))
+    except OSError as e:
+        raise UserError(f'Failed to read installed parts: {e}')
+    parts = {}
+    installed_parts = sections.get('buildout', {}).get('parts', '').split()
+    for name in installed_parts:
+        options = sections.get(name)
+        if not options:
+            continue
+        recipe = options.get('recipe', '').split(':')[0].strip()
+        if recipe != RECIPE_NAME:
+            continue
+        for key, value in options.items():
+            if '%(' in value:
+                for pattern, replacement in _SPACEY_DEFAULTS:
+                    value = value.replace(pattern, replacement)
+                options[key] = value
+        parts[name] = options
+    return parts
+
+
+def read_script_paths(script_path: str, base: str) -> Optional[List[str]]:
+    """Returns paths that the script generated by zc.buildout
+    inserts into ``sys.path``.
+    """
+    try:
+        if os.path.getsize(script_path) > _MAX_SCRIPT_SIZE:
+            return None
+        with open(script_path, 'rt', errors='replace') as f:
+            content = f.read()
+    except OSError:
+        return None
+    match = _SYS_PATH_RE.search(content)
+    if not match:
+        return None
+    paths = []
+    for is_relative, literal in _SYS_PATH_ITEM_RE.findall(match.group(1)):
+        try:
+            path = ast.literal_eval(literal)
+        except (ValueError, SyntaxError):
+            continue
+        if is_relative:
+            path = os.path.join(base, path)
+        paths.append(os.path.normpath(path))
+    return paths
+
+
+class SyncRecipe(Recipe):
+    """The recipe that takes the working set from ``sys.path`` of scripts
+    instead of resolving of eggs.
+    """
+
+    def __init__(self, buildout_dir: Path, name: str, options: Dict[str, str]):
+        self.options = options
+        self._resolution: Optional[Resolution] = None
+        buildout = {
+            'buildout': {
+                'directory': str(buildout_dir),
+                **{key: options[key] for key in INSTALLED_DIRS},
+            },
+        }
+        super().__init__(buildout, name, options)
+
+    def _create_eggs(self, options):
+        return None
+
+    def _get_extra_paths(self) -> List[str]:
+        buildout_dir = self.buildout['buildout']['directory']
+        return [
+            os.path.normpath(os.path.join(buildout_dir, line.strip()))
+            for line in self.options.get('extra-paths', '').splitlines()
+            if line.strip()
+        ]
+
+    def reset_working_set(self):
+        """Forgets the working set read from scripts."""
+        self._resolution = None
+
+    def _resolve(self) -> Resolution:
+        if self._resolution is None:
+            self._resolution = self._read_working_set()
+        return self._resolution
+
+    def _read_working_set(self) -> Resolution:
+        logger = logging.getLogger(self.name)
+        buildout_cfg = self.buildout['buildout']
+        develop_names = self._get_develop_names()
+        requirements = {
+            normalize_project_name(re.split(r'[\s\[<>=!~;]', line.strip())[0])
+            for line in self.options['eggs'].splitlines()
+            if line.strip()
+        }
+        bin_dir = buildout_cfg['bin-directory']
+        scripts = []
+        for entry in FsSnapshot().listdir(bin_dir).values():
+            if not entry.is_file():
+                continue
+            paths = read_script_paths(entry.path, buildout_cfg['directory'])
+            if paths:
+                names = {self._get_project_name(p, develop_names) for p in paths}
+                scripts.append((entry.name, paths, requirements <= names))
+        if not scripts:
+            raise UserError(
+                f'Scripts with sys.path have not found in {bin_dir}. '
+                f'Run buildout to resolve the working set.'
+            )
+        matched = [script for script in scripts if script[2]]
+        if not matched:
+            logger.warning(
+                'Any script has not all required eggs, '
+                'paths of all scripts are used.'
+            )
+            matched = scripts
+        logger.debug(
+            'Working set has taken from scripts: '
+            + ', '.join(sorted(name for name, _, _ in matched))
+        )
+        dists = {}
+        for _, paths, _ in sorted(matched):
+            for path in paths:
+                if path not in dists:
+                    dists[path] = ResolvedDist(
+                        self._get_project_name(path, develop_names),
+                        path,
+                    )
+        return tuple(dists.values())
+
+    def _get_develop_names(self) -> Dict[str, str]:
+        """Returns normalized names of develop projects by their paths."""
+        develop_eggs_dir = self.buildout['buildout']['develop-eggs-directory']
+        egg_links = self.snapshot.get_egg_links(develop_eggs_dir)
+        targets = self.snapshot.read_egg_links(egg_links.values())
+        return {
+            targets[link_path]: name
+            for name, link_path in egg_links.items()
+            if targets[link_path]
+        }
+
+    @staticmethod
+    def _get_project_name(path: str, develop_names: Dict[str, str]) -> str:
+        name = develop_names.get(path)
+        if name:
+            return name
+        # Name of egg has format "<project>-<version>-<python>.egg"
+        return normalize_project_name(os.path.basename(path).split('-')[0])
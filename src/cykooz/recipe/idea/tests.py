@@ -2,7 +2,16 @@
 :Authors: cykooz
 :Date: 03.12.2021
 """
+import json
+import logging
 import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import zipfile
 from pathlib import Path
 from sys import version_info
 
@@ -10,16 +19,30 @@ import pkg_resources
 import pytest
 import zc.buildout
 import zc.buildout.testing
+import zc.recipe.egg
 from zc.buildout.buildout import Buildout
 from zc.buildout.tests import create_sample_eggs
 
-from cykooz.recipe.idea import Recipe
+from cykooz.recipe.idea import Recipe, resolution, sync
+from cykooz.recipe.idea.farm import SymlinkFarm
+from cykooz.recipe.idea.iml import LibraryRef, patch_application_libraries, patch_module
+from cykooz.recipe.idea.library import is_own_library
+from cykooz.recipe.idea.metadata import read_requirements, read_requires
+from cykooz.recipe.idea.module_index import ModuleIndex
+from cykooz.recipe.idea.snapshot import FsSnapshot
+from cykooz.recipe.idea.stubgen import render_module
+from cykooz.recipe.idea.stubs import StubsCache
+from cykooz.recipe.idea.unzip import UnzippedEggsCache
+from cykooz.recipe.idea.utils import write_if_changed
+from cykooz.recipe.idea.watch import Watcher
 
 
 BUILDOUT_VERSION = pkg_resources.working_set.find(
     pkg_resources.Requirement.parse('zc.buildout')
 ).version
 IS_BUILDOUT2 = BUILDOUT_VERSION.startswith('2.')
+# Seconds
+MAX_IMPORT_TIME = 0.5
 
 
 @pytest.fixture(name='build_env')
@@ -104,15 +127,19 @@ setup(
 
     # With develop packages
     build_env.write('.idea', 'project.iml', content=PROJECT_IML)
-    Recipe(
+    recipe = Recipe(
         buildout, 'test',
         {
             'eggs': eggs,
             'include_develop': 'true',
         }
-    ).install()
+    )
+    recipe.install()
     paths = get_result_paths(result_path)
     assert len(paths) == 3
+    entries = list(recipe.iter_paths())
+    assert [category for category, _ in entries] == ['develop', 'eggs', 'eggs']
+    assert entries[0].path == Path(build_env.buildout_dir)
     assert paths[0] == Path(build_env.buildout_dir)
     for i, egg_name in enumerate(('demo-0.3', 'demoneeded-1.1')):
         path = paths[i + 1].as_posix()
@@ -149,6 +176,1113 @@ setup(
     ]
 
 
+def test_lazy_construction(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    recipe = Recipe(buildout, 'test', {'eggs': 'demo'})
+    recipe.install()
+    assert recipe._eggs_instance is None
+
+    # Heavy modules are not imported by the recipe. Buildout itself
+    # is already imported when it loads the recipe.
+    code = '\n'.join((
+        'import sys, time',
+        'import zc.buildout.buildout',
+        'modules = set(sys.modules)',
+        'start = time.perf_counter()',
+        'import cykooz.recipe.idea',
+        'print(time.perf_counter() - start)',
+        'print(" ".join(sorted(set(sys.modules) - modules)))',
+    ))
+    output = subprocess.check_output([sys.executable, '-c', code], text=True)
+    duration, modules = output.splitlines()
+    modules = set(modules.split())
+    for module in (
+        'zc.recipe.egg',
+        'cykooz.recipe.idea.resolution',
+        'xml.etree.ElementTree',
+        'xml.sax.saxutils',
+        'multiprocessing',
+    ):
+        assert module not in modules
+    assert float(duration) < MAX_IMPORT_TIME
+
+
+def test_fingerprint(build_env, monkeypatch):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    eggs = '\n'.join(('demo', 'setuptools'))
+
+    recipe = Recipe(buildout, 'test', {'eggs': eggs})
+    recipe.install()
+    assert recipe.fingerprint_path.exists()
+    result_mtime = recipe.result_path.stat().st_mtime_ns
+
+    # Nothing has changed - the working set must not be resolved again
+    recipe = Recipe(buildout, 'test', {'eggs': eggs})
+
+    def working_set():
+        raise AssertionError('working_set() must not be called')
+
+    monkeypatch.setattr(recipe._eggs, 'working_set', working_set)
+    recipe.install()
+    assert recipe.result_path.stat().st_mtime_ns == result_mtime
+
+    # Removed output file must be recreated
+    recipe.result_path.unlink()
+    monkeypatch.undo()
+    recipe = Recipe(buildout, 'test', {'eggs': eggs})
+    recipe.install()
+    assert len(get_result_paths(recipe.result_path)) == 2
+
+    # Changed options invalidate the fingerprint
+    old_fingerprint = recipe.fingerprint_path.read_text()
+    Recipe(buildout, 'test', {'eggs': eggs, 'include_other': 'true'}).install()
+    assert recipe.fingerprint_path.read_text() != old_fingerprint
+    assert len(get_result_paths(recipe.result_path)) == 3
+
+    # New directory matched with the glob of extra paths
+    # invalidates the fingerprint.
+    options = {'eggs': eggs, 'extra-paths': 'extra/*'}
+    Path('extra').mkdir()
+    Recipe(buildout, 'test', options).install()
+    assert len(get_result_paths(recipe.result_path)) == 2
+    Path('extra', 'lib').mkdir()
+    Recipe(buildout, 'test', options).install()
+    assert Path('extra', 'lib').resolve() in get_result_paths(recipe.result_path)
+
+
+def test_fingerprint_develop(build_env, monkeypatch):
+    build_env.write('setup.py', content=DEVELOP_SETUP_PY)
+    build_env.write('test_develop.py', content='')
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    options = {'eggs': 'test_develop\ndemo', 'include_develop': 'true'}
+    buildout = MockedBuildout(build_env.link_server)
+    buildout._develop()
+    recipe = Recipe(buildout, 'test', options)
+    recipe.install()
+    fingerprint = recipe.fingerprint_path.read_text()
+
+    # Buildout re-runs "setup.py develop" on every run
+    # without changing of develop eggs.
+    buildout._develop()
+    resolution.clear_cache()
+    recipe = Recipe(buildout, 'test', options)
+
+    def working_set():
+        raise AssertionError('working_set() must not be called')
+
+    monkeypatch.setattr(recipe._eggs, 'working_set', working_set)
+    recipe.install()
+    assert recipe.fingerprint_path.read_text() == fingerprint
+    monkeypatch.undo()
+
+    # Changed requirements of develop egg invalidate the fingerprint
+    build_env.write('setup.py', content=DEVELOP_SETUP_PY.replace(
+        'find_packages(),', "find_packages(),\n    install_requires=['demo'],"
+    ))
+    buildout._develop()
+    resolution.clear_cache()
+    Recipe(buildout, 'test', options).install()
+    assert recipe.fingerprint_path.read_text() != fingerprint
+
+
+def test_metrics(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    options = {'eggs': 'demo', 'metrics_prometheus': 'true', 'profile': 'true'}
+
+    recipe = Recipe(buildout, 'test', options)
+    recipe.install()
+    report = json.loads(recipe.metrics_path.read_text())
+    assert report['part'] == 'test'
+    assert not report['skipped']
+    assert {'scripts', 'resolve', 'classify', 'render', 'write', 'iml'} <= set(report['phases'])
+    assert report['roots'] == {'eggs': 2}
+    assert [(Path(w['path']).name, w['written']) for w in report['writes']] == [
+        ('Buildout_Eggs.xml', True),
+        ('project.iml', True),
+    ]
+    prometheus = recipe.metrics_prometheus_path.read_text()
+    assert 'cykooz_recipe_idea_roots{part="test",category="eggs"} 2' in prometheus
+    assert recipe.profile_path.stat().st_size > 0
+
+    recipe = Recipe(buildout, 'test', options)
+    recipe.install()
+    report = json.loads(recipe.metrics_path.read_text())
+    assert report['skipped']
+    assert report['writes'] == []
+
+
+def test_sync(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    buildout_dir = Path(build_env.buildout_dir)
+    bin_dir = Path(buildout['buildout']['bin-directory'])
+    bin_dir.mkdir(exist_ok=True)
+
+    options = {'recipe': 'cykooz.recipe.idea', 'eggs': 'demo'}
+    recipe = Recipe(buildout, 'idea', options)
+    recipe.install()
+    expected_data = recipe.result_path.read_bytes()
+    paths = recipe.get_paths()
+    assert len(paths) == 2
+    recipe.result_path.unlink()
+
+    # Script generated by zc.buildout and the buildout's script
+    write_script(bin_dir / 'app', paths)
+    (bin_dir / 'other').write_text(
+        "import sys\nsys.path[0:0] = [\n  join(base, 'eggs/other.egg'),\n  ]\n"
+    )
+    write_installed_cfg(buildout_dir, options)
+
+    assert sync.main(['-d', str(buildout_dir)]) == 0
+    assert recipe.result_path.read_bytes() == expected_data
+
+    # Unknown part
+    assert sync.main(['-d', str(buildout_dir), 'unknown']) == 1
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='Requires inotify')
+def test_watch(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    buildout_dir = Path(build_env.buildout_dir)
+    bin_dir = Path(buildout['buildout']['bin-directory'])
+    bin_dir.mkdir(exist_ok=True)
+    (buildout_dir / 'extra').mkdir()
+
+    options = {
+        'recipe': 'cykooz.recipe.idea',
+        'eggs': 'demo',
+        'extra-paths': str(buildout_dir / 'extra' / '*'),
+    }
+    recipe = Recipe(buildout, 'idea', options)
+    egg_paths = recipe.get_paths()
+    write_script(bin_dir / 'app', egg_paths)
+    write_installed_cfg(buildout_dir, options)
+
+    def wait_paths(expected):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            if (
+                recipe.result_path.exists()
+                and get_result_paths(recipe.result_path) == sorted(expected)
+            ):
+                return True
+            time.sleep(0.05)
+        return False
+
+    stop = threading.Event()
+    watcher = Watcher(buildout_dir, debounce=0.05)
+    thread = threading.Thread(target=watcher.run, args=(stop,))
+    thread.start()
+    try:
+        assert wait_paths(egg_paths)
+
+        # New directory matched with the glob of extra paths
+        (buildout_dir / 'extra' / 'lib').mkdir()
+        assert wait_paths(egg_paths + [buildout_dir / 'extra' / 'lib'])
+
+        # Scripts have regenerated by buildout
+        write_script(bin_dir / 'app', egg_paths[:1])
+        assert wait_paths(egg_paths[:1] + [buildout_dir / 'extra' / 'lib'])
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_watch_incremental(build_env, monkeypatch):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    buildout_dir = Path(build_env.buildout_dir)
+    bin_dir = Path(buildout['buildout']['bin-directory'])
+    bin_dir.mkdir(exist_ok=True)
+    (buildout_dir / 'extra').mkdir()
+    (buildout_dir / 'other').mkdir()
+
+    options = {
+        'recipe': 'cykooz.recipe.idea',
+        'eggs': 'demo',
+        'extra-paths': '\n  '.join([
+            str(buildout_dir / 'extra' / '*'),
+            str(buildout_dir / 'other' / '*'),
+        ]),
+    }
+    recipe = Recipe(buildout, 'idea', options)
+    egg_paths = recipe.get_paths()
+    write_script(bin_dir / 'app', egg_paths)
+    write_installed_cfg(buildout_dir, options)
+
+    watcher = Watcher(buildout_dir)
+    watcher._recipes = sync.get_sync_recipes(buildout_dir)
+    assert watcher.update() == ['idea']
+    sync_recipe = watcher._recipes[0]
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError('must not be called')
+
+    expand_extra_path = sync_recipe._expand_extra_path
+    expanded = []
+
+    def expand_extra_path_spy(pattern):
+        expanded.append(pattern)
+        return expand_extra_path(pattern)
+
+    monkeypatch.setattr(sync_recipe, '_classify_working_set', forbidden)
+    monkeypatch.setattr(sync_recipe, '_expand_extra_path', expand_extra_path_spy)
+
+    # Only the glob whose directory has changed is expanded again
+    (buildout_dir / 'extra' / 'lib').mkdir()
+    (buildout_dir / 'other' / 'lib').mkdir()
+    changes = {'extra': {str(buildout_dir / 'extra')}}
+    assert watcher.update(changes) == ['idea']
+    assert expanded == [str(buildout_dir / 'extra' / '*')]
+    assert get_result_paths(recipe.result_path) == sorted(
+        egg_paths + [buildout_dir / 'extra' / 'lib']
+    )
+
+    # Other egg-links are not read
+    expanded.clear()
+    monkeypatch.setattr(sync_recipe, '_get_develop_paths', forbidden)
+    assert watcher.update({'develop-eggs': {'other.egg-link'}}) == []
+    assert expanded == []
+
+
+def test_reuse_working_set(build_env, monkeypatch):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+
+    # Other part resolves the same eggs
+    zc.recipe.egg.Eggs(buildout, 'app', {'eggs': 'demo\nsetuptools'}).working_set()
+
+    def working_set():
+        raise AssertionError('working_set() must not be called')
+
+    recipe = Recipe(buildout, 'idea1', {'eggs': '  setuptools\n  Demo'})
+    monkeypatch.setattr(recipe._eggs, 'working_set', working_set)
+    paths = recipe.get_paths()
+    assert len(paths) == 2
+
+    # Working set resolved by this recipe is reused by other part
+    # of the same buildout without resolving.
+    recipe = Recipe(buildout, 'idea2', {'eggs': 'demo\nsetuptools'})
+    monkeypatch.setattr(recipe._eggs, 'working_set', working_set)
+    assert recipe.get_paths() == paths
+
+
+def test_resolution_cache(build_env, monkeypatch):
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    options = {'eggs': 'demo', 'resolution_cache': 'true'}
+    recipe = Recipe(MockedBuildout(build_env.link_server), 'test', options)
+    paths = recipe.get_paths()
+    assert recipe.resolution_cache_path.exists()
+
+    calls = []
+
+    def new_recipe():
+        resolution.clear_cache()
+        recipe = Recipe(MockedBuildout(build_env.link_server), 'test', options)
+        working_set = recipe._eggs.working_set
+
+        def wrapper(*args, **kwargs):
+            calls.append(True)
+            return working_set(*args, **kwargs)
+
+        monkeypatch.setattr(recipe._eggs, 'working_set', wrapper)
+        return recipe
+
+    # Working set is loaded from the cache
+    assert new_recipe().get_paths() == paths
+    assert not calls
+
+    # Removed egg invalidates the cache
+    egg_path = paths[0]
+    egg_path.rename(egg_path.with_name('removed'))
+    new_recipe().get_paths()
+    assert calls
+
+
+def test_resolution_cache_develop(build_env, monkeypatch):
+    build_env.write('setup.py', content=DEVELOP_SETUP_PY)
+    build_env.write('test_develop.py', content='')
+    options = {
+        'eggs': 'test_develop\ndemo',
+        'include_develop': 'true',
+        'resolution_cache': 'true',
+    }
+    buildout = MockedBuildout(build_env.link_server)
+    buildout._develop()
+    paths = Recipe(buildout, 'test', options).get_paths()
+    assert Path(build_env.buildout_dir).resolve() in paths
+
+    # Buildout re-runs "setup.py develop" and files of the working copy
+    # are changed - the cache is still valid.
+    buildout = MockedBuildout(build_env.link_server)
+    buildout._develop()
+    build_env.write('new_module.py', content='')
+    resolution.clear_cache()
+    recipe = Recipe(buildout, 'test', options)
+    monkeypatch.setattr(recipe._eggs, 'working_set', None)
+    assert recipe.get_paths() == paths
+
+
+def test_multiple_projects(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    # The first project has two modules listed in modules.xml
+    build_env.mkdir('.idea')
+    build_env.mkdir('service')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    build_env.write('.idea', 'unlisted.iml', content=PROJECT_IML)
+    build_env.write('service', 'service.iml', content=PROJECT_IML)
+    build_env.write('.idea', 'modules.xml', content=MODULES_XML)
+    # The second project has not modules.xml
+    build_env.mkdir('second')
+    build_env.mkdir('second', '.idea')
+    build_env.write('second', '.idea', 'second.iml', content=PROJECT_IML)
+    # The third project is absent
+
+    buildout_dir = Path(build_env.buildout_dir)
+    recipe = Recipe(
+        buildout, 'test',
+        {
+            'eggs': 'demo',
+            'idea_dir': '\n'.join((
+                str(buildout_dir / '.idea'),
+                str(buildout_dir / 'second' / '.idea'),
+                str(buildout_dir / 'third' / '.idea'),
+            )),
+        }
+    )
+    assert recipe.result_path == buildout_dir / '.idea' / 'libraries' / 'Buildout_Eggs.xml'
+    recipe.install()
+
+    for idea_dir in ('.idea', 'second/.idea'):
+        paths = get_result_paths(buildout_dir / idea_dir / 'libraries' / 'Buildout_Eggs.xml')
+        assert len(paths) == 2
+    assert not (buildout_dir / 'third').exists()
+
+    order_entry = '<orderEntry type="library" name="Buildout Eggs" level="project" />'
+    for iml_path in ('.idea/project.iml', 'service/service.iml', 'second/.idea/second.iml'):
+        assert order_entry in (buildout_dir / iml_path).read_text()
+    assert order_entry not in (buildout_dir / '.idea' / 'unlisted.iml').read_text()
+
+
+def test_split_libraries(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    buildout_dir = Path(build_env.buildout_dir)
+    libraries_dir = buildout_dir / '.idea' / 'libraries'
+    iml_path = buildout_dir / '.idea' / 'project.iml'
+    eggs = '\n'.join(('demo', 'setuptools'))
+
+    def get_order_entries():
+        return re.findall(
+            r'<orderEntry type="library" name="([^"]+)" level="project" />',
+            iml_path.read_text(),
+        )
+
+    Recipe(buildout, 'test', {'eggs': eggs}).install()
+    assert sorted(p.name for p in libraries_dir.iterdir()) == ['Buildout_Eggs.xml']
+    assert get_order_entries() == ['Buildout Eggs']
+
+    Recipe(
+        buildout, 'test',
+        {
+            'eggs': eggs,
+            'include_other': 'true',
+            'split_libraries': 'category',
+        }
+    ).install()
+    assert sorted(p.name for p in libraries_dir.iterdir()) == [
+        'Buildout_Eggs_eggs.xml',
+        'Buildout_Eggs_other.xml',
+    ]
+    assert len(get_result_paths(libraries_dir / 'Buildout_Eggs_eggs.xml')) == 2
+    assert len(get_result_paths(libraries_dir / 'Buildout_Eggs_other.xml')) == 1
+    assert get_order_entries() == ['Buildout Eggs eggs', 'Buildout Eggs other']
+
+    Recipe(
+        buildout, 'test',
+        {
+            'eggs': eggs,
+            'split_libraries': 'hash',
+            'split_buckets': '64',
+        }
+    ).install()
+    file_names = sorted(p.name for p in libraries_dir.iterdir())
+    assert len(file_names) == 2
+    assert all(re.match(r'Buildout_Eggs_\d\d\.xml', name) for name in file_names)
+    assert len(get_order_entries()) == 2
+    assert 'Buildout Eggs eggs' not in iml_path.read_text()
+
+    for value in ('0', 'many'):
+        options = {'eggs': eggs, 'split_libraries': 'hash', 'split_buckets': value}
+        with pytest.raises(zc.buildout.UserError, match='split_buckets'):
+            Recipe(buildout, 'test', options)
+
+
+def test_exclude(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    recipe = Recipe(buildout, 'test', {'eggs': 'demo'})
+    egg_path = get_demo_path(recipe.get_paths())
+    for rel_path in ('tests', 'demo_pkg/tests', 'demo_pkg/docs', 'demo_pkg/subpkg'):
+        (egg_path / rel_path).mkdir(parents=True)
+    (egg_path / 'demo_pkg' / 'tests.py').write_text('')
+
+    recipe.install()
+    excluded = get_result_paths(recipe.result_path, 'excluded')
+    assert [p for p in excluded if egg_path in p.parents] == [
+        egg_path / 'EGG-INFO',
+        egg_path / 'demo_pkg' / 'docs',
+        egg_path / 'demo_pkg' / 'tests',
+        egg_path / 'tests',
+    ]
+    assert len(get_result_paths(recipe.result_path)) == 2
+
+    recipe = Recipe(
+        MockedBuildout(build_env.link_server), 'test',
+        {'eggs': 'demo', 'exclude': 'demo_pkg/subpkg'},
+    )
+    recipe.install()
+    assert get_result_paths(recipe.result_path, 'excluded') == [
+        egg_path / 'demo_pkg' / 'subpkg',
+    ]
+
+    recipe = Recipe(
+        MockedBuildout(build_env.link_server), 'test',
+        {'eggs': 'demo', 'exclude': ''},
+    )
+    recipe.install()
+    assert '<excluded>' not in recipe.result_path.read_text()
+
+
+def test_module_index(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    options = {'eggs': 'demo', 'emitters': 'module_index'}
+    recipe = Recipe(buildout, 'test', options)
+    recipe.install()
+    index_path = recipe.part_dir / 'modules.json'
+    paths = recipe.get_paths()
+    demo_path = str(get_demo_path(paths))
+    needed_path = str(next(p for p in paths if p.name.startswith('demoneeded-')))
+    index = ModuleIndex.load(index_path)
+    assert index.find('eggrecipedemo') == [(demo_path, 'demo')]
+    assert index.find('eggrecipedemoneeded.sub') == [(needed_path, 'demoneeded')]
+    assert index.find('missing') == []
+
+    # Modules of unchanged roots are taken from the previous index
+    data = json.loads(index_path.read_text())
+    demo_root = next(root for root in data['roots'] if root['path'] == demo_path)
+    demo_root['modules'] = {'cached': 'demo'}
+    index_path.write_text(json.dumps(data))
+    Recipe(MockedBuildout(build_env.link_server), 'test', options).install()
+    index = ModuleIndex.load(index_path)
+    assert index.find('cached') == [(demo_path, 'demo')]
+    assert index.find('eggrecipedemo') == []
+
+
+def test_binary_stubs(tmp_path):
+    import _bisect
+    if not getattr(_bisect, '__file__', None):
+        pytest.skip('"_bisect" is built into the interpreter')
+    egg_path = tmp_path / 'fake-1.0-py3.egg'
+    (egg_path / 'fake').mkdir(parents=True)
+    (egg_path / 'fake' / '__init__.py').write_text('')
+    shutil.copy(_bisect.__file__, egg_path / 'fake')
+    (tmp_path / 'pure.egg').mkdir()
+    cache = StubsCache(
+        tmp_path / 'cache', tmp_path / 'stubs.json', logging.getLogger('test')
+    )
+    dirs = cache.get_dirs([str(egg_path), str(tmp_path / 'pure.egg')], [])
+    assert list(dirs) == [str(egg_path)]
+    stubs_dir = Path(dirs[str(egg_path)])
+    content = (stubs_dir / 'fake' / '_bisect.pyi').read_text()
+    assert 'def bisect_left(' in content
+    assert (stubs_dir / 'fake' / 'py.typed').read_text() == 'partial\n'
+    assert cache.get_cached_dirs() == [str(stubs_dir)]
+
+    # Existing stubs are reused
+    (stubs_dir / 'fake' / '_bisect.pyi').write_text('cached')
+    assert cache.get_dirs([str(egg_path)], []) == dirs
+    assert (stubs_dir / 'fake' / '_bisect.pyi').read_text() == 'cached'
+
+    # Modules that print to stdout or crash the process
+    # don't discard stubs of other modules.
+    (egg_path / 'noisy.py').write_text('print("[noise")\n')
+    (egg_path / 'crash.py').write_text('import os\nos._exit(3)\n')
+    stubs_dir = tmp_path / 'cache' / 'generated'
+    modules = ['crash', 'fake._bisect', 'noisy']
+    assert cache._generate(stubs_dir, modules, [str(egg_path)])
+    assert (stubs_dir / '.done').read_text().split() == ['fake._bisect', 'noisy']
+    assert (stubs_dir / 'fake' / '_bisect.pyi').exists()
+    assert not (stubs_dir / 'crash.pyi').exists()
+
+    # Hung process doesn't add stubs into the cache
+    (egg_path / 'hang.py').write_text('import time\ntime.sleep(60)\n')
+    cache.timeout = 1
+    stubs_dir = tmp_path / 'cache' / 'hung'
+    assert not cache._generate(stubs_dir, ['noisy', 'hang'], [str(egg_path)])
+    assert not stubs_dir.exists()
+    assert not list(stubs_dir.parent.glob('*.tmp'))
+
+
+def test_render_stub():
+    import ast
+    import types
+
+    module = types.ModuleType('fake')
+
+    class Outer:
+        class Inner:
+            def method(self, a, *, b=1):
+                pass
+
+        def other(self):
+            pass
+
+        value = 1
+
+    Outer.__module__ = 'fake'
+    module.Outer = Outer
+    module.func = lambda x, y=2: None
+    content = render_module(module)
+    tree = ast.parse(content)
+    outer = next(n for n in tree.body if isinstance(n, ast.ClassDef))
+    assert [type(n).__name__ for n in outer.body] == [
+        'ClassDef', 'FunctionDef', 'AnnAssign',
+    ]
+    assert 'def method(self, a, *, b=...) -> Any: ...' in content
+
+
+def test_application_library(build_env, tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    config_dir = tmp_path / 'PyCharm2026.1'
+    options = {
+        'eggs': 'demo',
+        'application_library': 'true',
+        'idea_config_dir': str(config_dir),
+    }
+    recipe = Recipe(buildout, 'test', options)
+    recipe.install()
+    app_libraries_path = config_dir / 'options' / 'applicationLibraries.xml'
+    assert len(get_result_paths(app_libraries_path)) == 2
+    # All roots are shared, so the project library is not needed
+    assert not recipe.result_path.exists()
+    iml = Path('.idea', 'project.iml').read_text()
+    names = re.findall(r'name="(Buildout Eggs \w{12})" level="application"', iml)
+    assert len(names) == 1
+    assert 'level="project"' not in iml
+    content = app_libraries_path.read_text()
+    assert f'<library name="{names[0]}" type="python">' in content
+
+    # Other part with the same eggs uses the same library
+    Recipe(MockedBuildout(build_env.link_server), 'other', options).install()
+    assert app_libraries_path.read_text() == content
+
+    # Unused libraries are removed only if no part refers to them
+    def get_library_names():
+        return re.findall(r'<library name="([^"]+)"', app_libraries_path.read_text())
+
+    options['eggs'] = 'demoneeded'
+    Recipe(MockedBuildout(build_env.link_server), 'test', options).install()
+    new_names = get_library_names()
+    assert len(new_names) == 2 and names[0] in new_names
+    Recipe(MockedBuildout(build_env.link_server), 'other', options).install()
+    assert get_library_names() == [n for n in new_names if n != names[0]]
+    # Parts with removed directories are forgotten
+    Path('parts', 'other').rename(Path('parts', 'removed'))
+    options['eggs'] = 'demo'
+    Recipe(MockedBuildout(build_env.link_server), 'test', options).install()
+    assert get_library_names() == names
+
+    # Libraries of the file are kept
+    data = patch_application_libraries(
+        b'<application>\n  <component name="libraryTable">\n'
+        b'    <library name="Other" />\n  </component>\n</application>\n',
+        'Buildout Eggs 0123456789ab',
+        '<library name="Buildout Eggs 0123456789ab">\n  <CLASSES />\n</library>',
+    )
+    assert data == (
+        b'<application>\n  <component name="libraryTable">\n'
+        b'    <library name="Other" />\n'
+        b'    <library name="Buildout Eggs 0123456789ab">\n'
+        b'      <CLASSES />\n'
+        b'    </library>\n'
+        b'  </component>\n</application>\n'
+    )
+    assert patch_application_libraries(
+        data, 'Buildout Eggs 0123456789ab', '<library />'
+    ) is None
+
+
+def test_emitters(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.write('pyrightconfig.json', content='{"typeCheckingMode": "basic"}')
+    options = {
+        'eggs': 'demo',
+        'emitters': 'pyright vscode pth',
+        'pth_file': 'paths.txt',
+    }
+    # Emitters other than "idea" don't need an Idea project
+    recipe = Recipe(buildout, 'test', options)
+    recipe.install()
+    paths = [p.as_posix() for p in recipe.get_paths()]
+    assert len(paths) == 2
+    assert json.loads(Path('pyrightconfig.json').read_text()) == {
+        'typeCheckingMode': 'basic',
+        'extraPaths': paths,
+    }
+    assert json.loads(Path('.vscode', 'settings.json').read_text()) == {
+        'python.analysis.extraPaths': paths,
+    }
+    assert Path('paths.txt').read_text().splitlines() == paths
+    assert not recipe.result_path.exists()
+
+    # Changed output is regenerated
+    Path('paths.txt').unlink()
+    Recipe(MockedBuildout(build_env.link_server), 'test', options).install()
+    assert Path('paths.txt').read_text().splitlines() == paths
+
+    with pytest.raises(zc.buildout.UserError):
+        Recipe(
+            MockedBuildout(build_env.link_server), 'test',
+            {'eggs': 'demo', 'emitters': 'idea unknown'},
+        )
+
+
+def test_split_by_imports(build_env):
+    build_env.write('setup.py', content='''
+from setuptools import setup
+setup(name='test_develop', version='1.0.0', py_modules=['test_develop'])
+''')
+    build_env.write('test_develop.py', content='import os\nfrom eggrecipedemoneeded import x\n')
+    build_env.mkdir('tests')
+    build_env.write('tests', 'test_app.py', content='import eggrecipedemo\n')
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    buildout = MockedBuildout(build_env.link_server)
+    buildout._develop()
+    options = {
+        'eggs': 'test_develop\ndemo',
+        'include_develop': 'true',
+        'split_libraries': 'imports',
+    }
+
+    def get_libraries():
+        libraries_dir = Path('.idea', 'libraries')
+        return {
+            path.name: sorted(
+                p.name.split('-')[0] if p.parent.name == 'eggs' else 'develop'
+                for p in get_result_paths(path)
+            )
+            for path in sorted(libraries_dir.iterdir())
+        }
+
+    recipe = Recipe(buildout, 'test', options)
+    recipe.install()
+    # Imports of tests are not analysed by default
+    assert get_libraries() == {
+        'Buildout_Eggs_cold.xml': ['demo'],
+        'Buildout_Eggs_hot.xml': ['demoneeded', 'develop'],
+    }
+    iml = Path('.idea', 'project.iml').read_text()
+    assert iml.index('Buildout Eggs hot') < iml.index('Buildout Eggs cold')
+    cache = json.loads(recipe.imports_cache_path.read_text())
+    assert sorted(os.path.basename(path) for path in cache) == [
+        'setup.py', 'test_develop.py',
+    ]
+
+    # Cold library is omitted
+    recipe = Recipe(
+        MockedBuildout(build_env.link_server), 'test',
+        dict(options, omit_cold_library='true'),
+    )
+    recipe.install()
+    assert list(get_libraries()) == ['Buildout_Eggs_hot.xml']
+
+    # Imports of tests make "demo" hot, "demoneeded" is its requirement
+    recipe = Recipe(
+        MockedBuildout(build_env.link_server), 'test',
+        dict(options, exclude=''),
+    )
+    recipe.install()
+    assert get_libraries() == {
+        'Buildout_Eggs_hot.xml': ['demo', 'demoneeded', 'develop'],
+    }
+
+
+def test_resolver_by_pins(build_env, monkeypatch):
+    options = {'eggs': 'demo'}
+    paths = Recipe(MockedBuildout(build_env.link_server), 'test', options).get_paths()
+    options['resolver'] = 'pins'
+
+    def get_paths(versions):
+        resolution.clear_cache()
+        buildout = MockedBuildout(build_env.link_server)
+        # Buildout has set versions from its empty "versions" section
+        old_versions = zc.buildout.easy_install.default_versions(versions)
+        try:
+            recipe = Recipe(buildout, 'test', options)
+            monkeypatch.setattr(recipe._eggs, 'working_set', None)
+            return recipe.get_paths()
+        finally:
+            zc.buildout.easy_install.default_versions(old_versions)
+
+    # Requirements are ordered in another way than by buildout
+    assert sorted(get_paths({'demo': '0.3', 'DemoNeeded': '1.1'})) == sorted(paths)
+
+    with pytest.raises(zc.buildout.UserError, match='demoneeded.+is not pinned'):
+        get_paths({'demo': '0.3'})
+    with pytest.raises(zc.buildout.UserError, match=r'demo==0\.1 has not found'):
+        get_paths({'demo': '0.1', 'demoneeded': '1.1'})
+
+    options['eggs'] = 'demo>=0.5'
+    with pytest.raises(zc.buildout.UserError, match='does not match'):
+        get_paths({'demo': '0.3', 'demoneeded': '1.1'})
+
+
+def test_resolver_by_pins_prereleases(tmp_path):
+    python_tag = f'py{version_info[0]}.{version_info[1]}'
+    eggs_dir = tmp_path / 'eggs'
+    foo_path = eggs_dir / f'foo-1.0b1-{python_tag}.egg'
+    (foo_path / 'EGG-INFO').mkdir(parents=True)
+    (foo_path / 'EGG-INFO' / 'requires.txt').write_text('bar>=1.0\n')
+    bar_path = eggs_dir / f'bar-2.0rc1-{python_tag}.egg'
+    (bar_path / 'EGG-INFO').mkdir(parents=True)
+    (tmp_path / 'develop-eggs').mkdir()
+    result = resolution.resolve_by_pins(
+        ['foo'],
+        {'foo': '1.0b1', 'bar': '2.0rc1'},
+        str(eggs_dir),
+        str(tmp_path / 'develop-eggs'),
+        FsSnapshot(),
+    )
+    assert result == (
+        resolution.ResolvedDist('foo', str(foo_path)),
+        resolution.ResolvedDist('bar', str(bar_path)),
+    )
+
+
+def test_read_requires(tmp_path):
+    egg_info = tmp_path / 'app-1.0.egg' / 'EGG-INFO'
+    egg_info.mkdir(parents=True)
+    (egg_info / 'requires.txt').write_text(
+        'zope.interface>=5\nSix\n\n[:python_version < "3.8"]\n'
+        'importlib_metadata\n\n[test]\npytest\n'
+    )
+    assert read_requires(str(egg_info.parent), 'app') == [
+        'zope_interface', 'six', 'importlib_metadata',
+    ]
+    assert read_requirements(str(egg_info.parent), 'app') == [
+        'zope.interface>=5',
+        'Six',
+        'importlib_metadata; (python_version < "3.8")',
+        'pytest; extra == "test"',
+    ]
+
+    dist_info = tmp_path / 'site' / 'Other_App-2.0.dist-info'
+    dist_info.mkdir(parents=True)
+    (dist_info / 'METADATA').write_text(
+        'Name: other-app\nRequires-Dist: requests (>=2)\n'
+        'Requires-Dist: pytest ; extra == "test"\n\nRequires-Dist: body\n'
+    )
+    assert read_requires(str(dist_info.parent), 'other.app') == ['requests']
+    assert read_requires(str(tmp_path), 'missing') == []
+
+
+def test_cost_report(build_env):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    options = {'eggs': 'demo', 'cost_report': 'true'}
+    recipe = Recipe(buildout, 'test', options)
+    egg_path, needed_path = recipe.get_paths()
+    # Zipped egg is measured by its central directory
+    zip_path = egg_path.with_name('egg.zip')
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+        zip_file.writestr('demo/__init__.py', 'x' * 100)
+        zip_file.writestr('demo/data.txt', 'x' * 50)
+    shutil.rmtree(egg_path)
+    zip_path.rename(egg_path)
+
+    recipe.install()
+    report = json.loads(recipe.cost_report_path.read_text())
+    costs = {Path(root['path']): root for root in report['roots']}
+    assert costs[egg_path] == {
+        'path': str(egg_path),
+        'category': 'eggs',
+        'files': 2,
+        'py_files': 1,
+        'size': 150,
+    }
+    # Excluded dist-info is not counted
+    assert costs[needed_path]['files'] == 1
+    assert costs[needed_path]['py_files'] == 1
+    assert report['total']['files'] == 3
+    cache = json.loads(recipe.cost_cache_path.read_text())
+    assert sorted(cache['roots']) == sorted(str(p) for p in (egg_path, needed_path))
+
+    # Budget is exceeded
+    with pytest.raises(zc.buildout.UserError, match='max_files'):
+        Recipe(
+            MockedBuildout(build_env.link_server), 'test',
+            dict(options, max_files='2', budget_action='fail'),
+        ).install()
+    recipe = Recipe(
+        MockedBuildout(build_env.link_server), 'test',
+        dict(options, max_roots='2', max_files='3', max_bytes='1K'),
+    )
+    recipe.install()
+    assert recipe.result_path.exists()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='Requires symlinks')
+def test_overlapping_roots(build_env):
+    buildout_dir = Path(build_env.buildout_dir).resolve()
+    for rel_path in ('src/pkg/sub', 'lib'):
+        (buildout_dir / rel_path).mkdir(parents=True)
+    (buildout_dir / 'src_link').symlink_to(buildout_dir / 'src')
+    extra_paths = 'src\nsrc_link\nsrc/pkg\nlib/../src/pkg/sub'
+
+    def get_paths(mode):
+        recipe = Recipe(
+            MockedBuildout(build_env.link_server), 'test',
+            {
+                'eggs': 'demo',
+                'include_eggs': 'false',
+                'extra-paths': extra_paths,
+                'overlapping_roots': mode,
+            },
+        )
+        paths = [p.relative_to(buildout_dir).as_posix() for p in recipe.get_paths()]
+        return paths, recipe.metrics.removed_roots
+
+    # Aliases of the same directory are always removed
+    assert get_paths('keep') == (['src', 'src/pkg', 'src/pkg/sub'], 1)
+    assert get_paths('ancestor') == (['src'], 3)
+    assert get_paths('specific') == (['src/pkg/sub'], 3)
+
+    with pytest.raises(zc.buildout.UserError):
+        get_paths('unknown')
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='Requires symlinks')
+def test_symlink_farm(tmp_path):
+    eggs_dir = tmp_path / 'eggs'
+    for egg_name, files in (
+        ('first-1.0.egg', ('ns/__init__.py', 'ns/first/__init__.py', 'single.py')),
+        ('second-1.0.egg', ('ns/__init__.py', 'ns/second/__init__.py', 'single.py')),
+        ('third-1.0.egg', ('third/__init__.py', 'third/__pycache__/x.pyc')),
+    ):
+        for file in ('EGG-INFO/PKG-INFO', *files):
+            path = eggs_dir / egg_name / file
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('')
+    first, second, third = sorted(str(p) for p in eggs_dir.iterdir())
+
+    site_dir = tmp_path / 'parts' / 'idea' / 'site'
+    farm = SymlinkFarm(site_dir)
+    assert farm.build([first, second]) > 0
+    assert sorted(p.name for p in site_dir.iterdir()) == ['ns', 'single.py']
+    # The first egg wins
+    assert os.readlink(site_dir / 'single.py') == os.path.join(first, 'single.py')
+    # Namespace package is merged
+    ns_dir = site_dir / 'ns'
+    assert ns_dir.is_dir() and not ns_dir.is_symlink()
+    assert sorted(p.name for p in ns_dir.iterdir()) == ['__init__.py', 'first', 'second']
+
+    # Nothing changed
+    assert farm.build([first, second]) == 0
+
+    # Incremental update
+    first_link = (ns_dir / 'first').stat()
+    assert farm.build([first, third]) > 0
+    assert sorted(p.name for p in site_dir.iterdir()) == ['ns', 'single.py', 'third']
+    assert (site_dir / 'ns').is_symlink()
+    assert (site_dir / 'ns' / 'first').stat() == first_link
+
+
+def test_unzip_eggs(build_env, tmp_path):
+    buildout = MockedBuildout(build_env.link_server)
+    build_env.mkdir('.idea')
+    build_env.write('.idea', 'project.iml', content=PROJECT_IML)
+    cache_dir = tmp_path / 'cache'
+    options = {
+        'eggs': 'demo',
+        'unzip_eggs': 'true',
+        'unzip_cache_dir': str(cache_dir),
+    }
+    # Replace installed egg with zipped one
+    egg_path = get_demo_path(Recipe(buildout, 'test', options).get_paths())
+    assert egg_path.name.startswith('demo-0.3')
+    zip_path = egg_path.with_name('egg.zip')
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+        for path in egg_path.rglob('*'):
+            zip_file.write(path, path.relative_to(egg_path).as_posix())
+    shutil.rmtree(egg_path)
+    zip_path.rename(egg_path)
+    resolution.clear_cache()
+
+    recipe = Recipe(MockedBuildout(build_env.link_server), 'test', options)
+    recipe.install()
+    paths = get_result_paths(recipe.result_path)
+    assert len(paths) == 2
+    unzipped = [path for path in paths if path.parent.parent == cache_dir]
+    assert len(unzipped) == 1
+    assert unzipped[0].name == egg_path.name
+    assert (unzipped[0] / 'EGG-INFO' / 'PKG-INFO').is_file()
+
+
+def test_unzipped_eggs_cache(tmp_path):
+    eggs = []
+    for i in range(3):
+        egg_path = tmp_path / 'eggs' / f'egg{i}-1.0.egg'
+        egg_path.parent.mkdir(exist_ok=True)
+        with zipfile.ZipFile(egg_path, 'w') as zip_file:
+            zip_file.writestr(f'egg{i}/__init__.py', 'x' * 1000)
+        eggs.append(str(egg_path))
+
+    cache_dir = tmp_path / 'cache'
+    logger = logging.getLogger('test')
+    cache = UnzippedEggsCache(cache_dir, 10000, tmp_path / 'memo.json', logger)
+    dirs = cache.get_dirs(eggs[:2])
+    assert sorted(dirs) == eggs[:2]
+    for egg_path, unzipped_dir in dirs.items():
+        name = Path(egg_path).name.split('-')[0]
+        assert (Path(unzipped_dir) / name / '__init__.py').read_text() == 'x' * 1000
+    assert sorted(cache.get_cached_dirs()) == sorted(dirs.values())
+
+    # The same egg in other buildout uses the same directory
+    other_cache = UnzippedEggsCache(cache_dir, 10000, tmp_path / 'other.json', logger)
+    assert other_cache.get_dirs(eggs[:1]) == {eggs[0]: dirs[eggs[0]]}
+
+    # The least recently used entry is evicted
+    os.utime(Path(dirs[eggs[1]]).parent, (1, 1))
+    small_cache = UnzippedEggsCache(cache_dir, 2000, tmp_path / 'memo.json', logger)
+    new_dirs = small_cache.get_dirs([eggs[0], eggs[2]])
+    assert Path(new_dirs[eggs[0]]).is_dir()
+    assert Path(new_dirs[eggs[2]]).is_dir()
+    assert not Path(dirs[eggs[1]]).exists()
+
+
+def test_patch_module():
+    head = '<?xml version="1.0" encoding="UTF-8"?>\n<module version="4" type="X">\n'
+    tail = '  <!-- comment -->\n</module>\n'
+
+    def patch(component, names=(LibraryRef('Buildout Eggs'),)):
+        data = (head + component + tail).encode('utf-8')
+        result = patch_module(data, names, is_own_library)
+        if result is None:
+            return None
+        result = result.decode('utf-8')
+        assert result.startswith(head) and result.endswith(tail)
+        return result[len(head):-len(tail)]
+
+    entry = '<orderEntry type="library" name="Buildout Eggs" level="project" />'
+    component = (
+        '  <component name="NewModuleRootManager" inherit-compiler-output="true">\n'
+        '    <orderEntry type="sourceFolder"  forTests="false"/>\n'
+        '  </component>\n'
+    )
+    patched = patch(component)
+    assert patched == (
+        '  <component name="NewModuleRootManager" inherit-compiler-output="true">\n'
+        '    <orderEntry type="sourceFolder"  forTests="false"/>\n'
+        f'    {entry}\n'
+        '  </component>\n'
+    )
+    assert patch(patched) is None
+
+    # Stale libraries are removed
+    assert patch(patched, [LibraryRef('Buildout Eggs 01')]) == (
+        '  <component name="NewModuleRootManager" inherit-compiler-output="true">\n'
+        '    <orderEntry type="sourceFolder"  forTests="false"/>\n'
+        '    <orderEntry type="library" name="Buildout Eggs 01" level="project" />\n'
+        '  </component>\n'
+    )
+
+    # Component without children
+    assert patch('  <component name="NewModuleRootManager">\n  </component>\n') == (
+        '  <component name="NewModuleRootManager">\n'
+        f'    {entry}\n'
+        '  </component>\n'
+    )
+    assert patch('  <component name="NewModuleRootManager" />\n') == (
+        '  <component name="NewModuleRootManager">\n'
+        f'    {entry}\n'
+        '  </component>\n'
+    )
+
+    # Module without the component
+    assert patch('  <component name="Other" />\n') is None
+
+    with pytest.raises(ValueError):
+        patch_module(b'<module>', [LibraryRef('Buildout Eggs')], is_own_library)
+
+
+def test_write_if_changed(tmp_path):
+    path = tmp_path / 'libraries' / 'lib.xml'
+    assert write_if_changed(path, b'content')
+    assert path.read_bytes() == b'content'
+    path.chmod(0o640)
+    mtime = path.stat().st_mtime_ns
+
+    # Same content - file is not touched
+    assert not write_if_changed(path, b'content')
+    assert path.stat().st_mtime_ns == mtime
+
+    assert write_if_changed(path, b'new content')
+    assert path.read_bytes() == b'new content'
+    if os.name == 'posix':
+        assert path.stat().st_mode & 0o777 == 0o640
+    # Temporary files are not left
+    assert [p.name for p in path.parent.iterdir()] == ['lib.xml']
+
+
+def test_fs_snapshot(tmp_path):
+    develop_eggs = tmp_path / 'develop-eggs'
+    develop_eggs.mkdir()
+    for name in ('my.project', 'other-project', 'third'):
+        target = tmp_path / 'src' / name
+        (develop_eggs / f'{name}.egg-link').write_text(f'{target}\n.')
+    (tmp_path / 'file.txt').write_text('')
+
+    snapshot = FsSnapshot()
+    assert snapshot.is_dir(develop_eggs)
+    assert not snapshot.is_dir(tmp_path / 'file.txt')
+    assert snapshot.exists(tmp_path / 'file.txt')
+    assert not snapshot.exists(tmp_path / 'absent')
+    assert snapshot.glob(tmp_path, '*.txt') == [str(tmp_path / 'file.txt')]
+
+    egg_links = snapshot.get_egg_links(develop_eggs)
+    assert sorted(egg_links) == ['my_project', 'other_project', 'third']
+    link_paths = [egg_links['my_project'], egg_links['other_project']]
+    assert snapshot.read_egg_links(link_paths) == {
+        egg_links['my_project']: str(tmp_path / 'src' / 'my.project'),
+        egg_links['other_project']: str(tmp_path / 'src' / 'other-project'),
+    }
+
+    # Content of directories is cached until invalidation
+    (tmp_path / 'new.txt').write_text('')
+    assert not snapshot.exists(tmp_path / 'new.txt')
+    snapshot.invalidate(tmp_path)
+    assert snapshot.exists(tmp_path / 'new.txt')
+
+
 def test_integration(build_env):
     build_env.write('setup.py', content='''
 from setuptools import setup, find_packages
@@ -198,12 +1332,33 @@ def get_egg_name(egg_base):
     return f'{egg_base}-py{version_info.major}.{version_info.minor}.egg'
 
 
-def get_result_paths(xml_path):
+def write_script(path, sys_path):
+    """Writes a script like generated by zc.buildout."""
+    path.write_text(
+        '#!/usr/bin/python\nimport sys\nsys.path[0:0] = [\n'
+        + ''.join(f'  {str(p)!r},\n' for p in sys_path)
+        + '  ]\n\nimport app\n'
+    )
+
+
+def write_installed_cfg(buildout_dir, options):
+    (buildout_dir / '.installed.cfg').write_text(
+        '[buildout]\nparts = idea\n\n[idea]\n'
+        + ''.join(f'{key} = {value}\n' for key, value in sorted(options.items()))
+    )
+
+
+def get_result_paths(xml_path, section='CLASSES'):
     result = open(xml_path, 'rt').read()
     lines = (line.strip() for line in result.strip().split('\n'))
     paths = []
+    in_section = False
     for line in lines:
-        if line.startswith('<root'):
+        if line in (f'<{section}>', f'<{section} />'):
+            in_section = True
+        elif line == f'</{section}>':
+            in_section = False
+        elif in_section and line.startswith('<root'):
             uri = line[11:-4]
 
             # ensure that file uri prefix is there, but remove if in the returned
@@ -248,6 +1403,21 @@ class Env:
         return self.globs['sample_buildout']
 
 
+DEVELOP_SETUP_PY = '''
+from setuptools import setup, find_packages
+setup(
+    name='test_develop',
+    version='1.0.0',
+    packages=find_packages(),
+)
+'''
+
+
+def get_demo_path(paths):
+    """Returns path of the egg "demo" from the working set."""
+    return next(path for path in paths if path.name.startswith('demo-'))
+
+
 class MockedBuildout(Buildout):
 
     def __init__(self, link_server: str, config_path=''):
@@ -301,3 +1471,16 @@ PROJECT_IML = '''<?xml version="1.0" encoding="UTF-8"?>
   </component>
 </module>
 '''
+
+
+MODULES_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<project version="4">
+  <component name="ProjectModuleManager">
+    <modules>
+      <module fileurl="file://$PROJECT_DIR$/.idea/project.iml" filepath="$PROJECT_DIR$/.idea/project.iml" />
+      <module fileurl="file://$PROJECT_DIR$/service/service.iml" filepath="$PROJECT_DIR$/service/service.iml" />
+      <module fileurl="file://$PROJECT_DIR$/absent/absent.iml" filepath="$PROJECT_DIR$/absent/absent.iml" />
+    </modules>
+  </component>
+</project>
+'''
@@ -0,0 +1,213 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .utils import MAX_WORKERS, get_stat, read_json_dict, write_if_changed
+
+
+_SIZE_FILE = '.size'
+_TMP_DIR_TTL = 24 * 3600
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def get_default_cache_dir(name: str = 'eggs') -> Path:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'cykooz.recipe.idea' / name
+
+
+def parse_size(value: str) -> int:
+    """Parses size like ``500M`` or ``2G`` into number of bytes."""
+    match = re.fullmatch(r'\s*(\d+)\s*([KMGT]?)B?\s*', value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f'Invalid size: {value}')
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+
+
+class UnzippedEggsCache:
+    """Content-addressed cache of unpacked zipped eggs that is shared
+    between buildouts. Every egg is unpacked into the directory
+    ``<cache dir>/<sha256 of egg file>/<egg file name>``.
+
+    Hashes of eggs are remembered in ``memo_path`` by size and
+    modification time of egg files, so eggs are not read on every run.
+    """
+
+    def __init__(self, cache_dir: Path, max_size: int, memo_path: Path,
+                 logger: logging.Logger, max_workers: int = MAX_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.memo_path = memo_path
+        self.logger = logger
+        self.max_workers = max_workers
+
+    def get_dirs(self, egg_paths: Iterable[str]) -> Dict[str, str]:
+        """Returns paths of unpacked directories by paths of zipped eggs.
+        Eggs that are absent in the cache are unpacked in a process pool.
+        """
+        memo = self._read_memo()
+        egg_paths = list(egg_paths)
+        new_memo = {}
+        missing = []
+        for egg_path in egg_paths:
+            stat = get_stat(egg_path)
+            entry = memo.get(egg_path)
+            if entry and stat and entry[:2] == stat and self._exists(entry[2]):
+                new_memo[egg_path] = entry
+            else:
+                missing.append(egg_path)
+
+        if missing:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            args = [(p, str(self.cache_dir)) for p in missing]
+            if len(missing) > 1 and self.max_workers > 1:
+                from concurrent.futures import ProcessPoolExecutor
+                workers = min(self.max_workers, len(missing))
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    digests = list(executor.map(_unpack_egg, *zip(*args)))
+            else:
+                digests = [_unpack_egg(*a) for a in args]
+            for egg_path, digest in zip(missing, digests):
+                stat = get_stat(egg_path)
+                if digest and stat:
+                    new_memo[egg_path] = [*stat, digest]
+            self.logger.debug(f'{len(missing)} zipped eggs have checked in the cache.')
+
+        result = {}
+        used = set()
+        for egg_path in egg_paths:
+            entry = new_memo.get(egg_path)
+            if entry:
+                digest = entry[2]
+                result[egg_path] = str(self.cache_dir / digest / os.path.basename(egg_path))
+                used.add(digest)
+        self._touch(used)
+        write_if_changed(
+            self.memo_path,
+            json.dumps(new_memo, indent=1, sort_keys=True).encode('utf-8'),
+        )
+        self.evict(keep=used)
+        return result
+
+    def get_cached_dirs(self) -> List[str]:
+        """Returns unpacked directories remembered by the last run."""
+        return [
+            str(self.cache_dir / digest / os.path.basename(egg_path))
+            for egg_path, (_, _, digest) in sorted(self._read_memo().items())
+        ]
+
+    def evict(self, keep=()):
+        """Removes least recently used entries while total size
+        of the cache exceeds the limit.
+        """
+        entries = []
+        total_size = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.tmp'):
+                        # Leftovers of crashed processes
+                        if entry.stat().st_mtime < time.time() - _TMP_DIR_TTL:
+                            shutil.rmtree(entry.path, ignore_errors=True)
+                        continue
+                    if not entry.is_dir():
+                        continue
+                    size = _read_size(entry.path)
+                    total_size += size
+                    entries.append((entry.stat().st_mtime, size, entry.name))
+        except OSError:
+            return
+        entries.sort()
+        for _, size, digest in entries:
+            if total_size <= self.max_size:
+                break
+            if digest in keep:
+                continue
+            _remove_dir(self.cache_dir / digest)
+            total_size -= size
+            self.logger.debug(f'Unpacked egg {digest} has evicted from the cache.')
+
+    def _exists(self, digest: str) -> bool:
+        return (self.cache_dir / digest / _SIZE_FILE).exists()
+
+    def _touch(self, digests):
+        """Updates time of the last use of entries."""
+        for digest in digests:
+            try:
+                os.utime(self.cache_dir / digest)
+            except OSError:
+                pass
+
+    def _read_memo(self) -> Dict[str, list]:
+        return read_json_dict(self.memo_path)
+
+
+def _unpack_egg(egg_path: str, cache_dir: str) -> Optional[str]:
+    """Unpacks the egg into the cache if it is absent there.
+    Returns SHA256 of the egg file. It is called in a separate process.
+    """
+    import zipfile
+    try:
+        digest = _get_file_hash(egg_path)
+    except OSError:
+        return None
+    entry_dir = os.path.join(cache_dir, digest)
+    if os.path.exists(os.path.join(entry_dir, _SIZE_FILE)):
+        return digest
+
+    # Egg is unpacked into a temporary directory which then is renamed,
+    # so other processes never see a partially unpacked egg.
+    tmp_dir = os.path.join(cache_dir, f'{digest}.{uuid.uuid4().hex}.tmp')
+    try:
+        target_dir = os.path.join(tmp_dir, os.path.basename(egg_path))
+        with zipfile.ZipFile(egg_path) as zip_file:
+            zip_file.extractall(target_dir)
+            size = sum(info.file_size for info in zip_file.infolist())
+        with open(os.path.join(tmp_dir, _SIZE_FILE), 'wt') as f:
+            f.write(str(size))
+        if os.path.exists(entry_dir):
+            # Broken entry without the size file
+            _remove_dir(Path(entry_dir))
+        os.rename(tmp_dir, entry_dir)
+    except (OSError, zipfile.BadZipFile):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(entry_dir, _SIZE_FILE)):
+            return None
+    return digest
+
+
+def _get_file_hash(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _read_size(entry_dir: str) -> int:
+    try:
+        with open(os.path.join(entry_dir, _SIZE_FILE), 'rt') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def _remove_dir(path: Path):
+    # Directory is renamed before removing to make removing atomic
+    # for other processes.
+    tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    try:
+        os.rename(path, tmp_path)
+    except OSError:
+        return
+    shutil.rmtree(tmp_path, ignore_errors=True)
@@ -0,0 +1,92 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+
+_O_BINARY = getattr(os, 'O_BINARY', 0)
+MAX_WORKERS = 8
+
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    """Writes data into the file only if it has different content.
+    Data is written into a temporary file which then atomically
+    replaces the target file, so readers never see a half-written file.
+
+    Returns ``True`` if the file has been written.
+    """
+    try:
+        with path.open('rb') as f:
+            if f.read() == data:
+                return False
+        mode = path.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = None
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp')
+    # Mode of new file is limited by umask of the process
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | _O_BINARY, 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def read_json_dict(path: Path) -> dict:
+    """Returns JSON object from the file or an empty dict if the file
+    is absent, broken or doesn't contain JSON object.
+    """
+    try:
+        with path.open('rt') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def get_stat(path) -> Optional[List[int]]:
+    """Returns ``[size, mtime in nanoseconds]`` of the file
+    or ``None`` if it is absent.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def get_mtime(path) -> Optional[int]:
+    """Returns mtime of the file in nanoseconds or ``None`` if it is absent."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def map_concurrently(func: Callable, items: Iterable,
+                     max_workers: int = MAX_WORKERS) -> List:
+    """Calls the function for every item in a thread pool
+    and returns results in the order of items.
+    """
+    items = list(items)
+    if len(items) < 2:
+        return [func(item) for item in items]
+    workers = min(max_workers, len(items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items))
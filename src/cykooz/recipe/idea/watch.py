@@ -0,0 +1,358 @@
+"""
+:Authors: cykooz
+:Date: 18.10.2026
+"""
+import ctypes
+import ctypes.util
+import errno
+import glob
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from zc.buildout import UserError
+
+from .snapshot import FsSnapshot, normalize_project_name
+from .sync import SyncRecipe, get_sync_recipes
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Kinds of watched directories
+BUILDOUT = 'buildout'
+BIN = 'bin'
+DEVELOP_EGGS = 'develop-eggs'
+EGGS = 'eggs'
+EXTRA = 'extra'
+
+DEFAULT_DEBOUNCE = 0.5
+
+
+class InotifyEvent(NamedTuple):
+    wd: int
+    mask: int
+    name: str
+
+
+class Inotify:
+    """Minimal wrapper of Linux inotify API based on ``ctypes``."""
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise UserError('Watch mode is supported only on Linux.')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise UserError(f'Failed to initialize inotify: {os.strerror(error)}')
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> Optional[int]:
+        """Returns descriptor of the watch or ``None``
+        if the directory doesn't exist.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return None
+            raise UserError(f'Failed to watch {path}: {os.strerror(error)}')
+        return wd
+
+    def read(self, timeout: Optional[float]) -> List[InotifyEvent]:
+        """Returns events that are received during the timeout."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append(InotifyEvent(wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class _PartState(NamedTuple):
+    # Classified distributions of the working set
+    classified: list
+    # Canonical paths by patterns of extra paths
+    extra_paths: Dict[str, List[str]]
+    entries: list
+
+
+class Watcher:
+    """Keeps libraries of installed parts in sync with eggs directories,
+    egg-links, scripts and extra paths.
+
+    Bursts of events are debounced. Classified distributions of the working
+    set and expanded extra paths are kept between bursts, and only entries
+    affected by changes are recomputed:
+
+    - scripts or ``.installed.cfg`` - the working set is read from scripts
+      and classified again;
+    - egg-links - only distributions of projects with changed egg-links
+      are classified again;
+    - directories of extra paths - only patterns whose watched directories
+      have changed are expanded again.
+
+    Library tables are rewritten only if the list of entries has changed.
+    """
+
+    def __init__(self, buildout_dir: Path, installed_path=None,
+                 part_names: Sequence[str] = (),
+                 debounce: float = DEFAULT_DEBOUNCE):
+        self.buildout_dir = buildout_dir.absolute()
+        self.installed_path = Path(
+            installed_path or self.buildout_dir / '.installed.cfg'
+        )
+        self.part_names = part_names
+        self.debounce = debounce
+        self.logger = logging.getLogger('idea_watch')
+        self._recipes: List[SyncRecipe] = []
+        self._states: Dict[str, _PartState] = {}
+        self._inotify: Optional[Inotify] = None
+        self._watches: Dict[int, Tuple[str, str]] = {}
+        self._extra_dirs: Set[str] = set()
+
+    def run(self, stop: threading.Event = None):
+        """Watches for changes until ``stop`` is set."""
+        stop = stop or threading.Event()
+        self._inotify = Inotify()
+        try:
+            self._load()
+            self.update()
+            while not stop.is_set():
+                changes = self._wait_changes(stop)
+                if changes:
+                    self._apply_changes(changes)
+                    self.update(changes)
+        finally:
+            self._inotify.close()
+
+    def update(self, changes: Dict[str, Set[str]] = None) -> List[str]:
+        """Rewrites libraries of parts whose list of paths has changed.
+        ``changes`` are changed names inside of watched directories
+        by kinds of directories, parts are fully recomputed if it
+        is ``None``. Returns names of updated parts.
+        """
+        updated = []
+        for recipe in self._recipes:
+            recipe._snapshot = FsSnapshot()
+            targets = recipe._get_targets()
+            if not recipe._get_active_emitters(targets):
+                continue
+            previous = self._states.get(recipe.name)
+            try:
+                state = self._get_state(recipe, previous, changes)
+            except UserError as e:
+                self.logger.warning(f'{recipe.name}: {e}')
+                continue
+            self._states[recipe.name] = state
+            if previous and state.entries == previous.entries:
+                continue
+            recipe._update_targets(targets, state.entries)
+            recipe._save_metrics()
+            updated.append(recipe.name)
+            self.logger.info(f'Libraries of part {recipe.name} have updated.')
+        return updated
+
+    def _get_state(self, recipe: SyncRecipe, previous: Optional[_PartState],
+                   changes: Optional[Dict[str, Set[str]]]) -> _PartState:
+        """Returns the state of the part with recomputed entries
+        affected by changes.
+        """
+        full = previous is None or changes is None or BIN in changes
+        if full:
+            classified = recipe._classify_working_set()
+        else:
+            classified = previous.classified
+            if DEVELOP_EGGS in changes:
+                names = changes[DEVELOP_EGGS]
+                project_names = None
+                if all(name.endswith('.egg-link') for name in names):
+                    project_names = {
+                        normalize_project_name(name[:-len('.egg-link')])
+                        for name in names
+                    }
+                classified = recipe._reclassify_develop(classified, project_names)
+
+        changed_dirs = set() if full else changes.get(EXTRA, set())
+        extra_paths = {}
+        for pattern in recipe._get_extra_paths():
+            if (
+                not full
+                and pattern in previous.extra_paths
+                and not changed_dirs.intersection(
+                    os.path.normpath(path) for path in _get_watched_dirs(pattern)
+                )
+            ):
+                extra_paths[pattern] = previous.extra_paths[pattern]
+            else:
+                extra_paths[pattern] = [
+                    recipe.snapshot.realpath(path)
+                    for path in recipe._expand_extra_path(pattern)
+                ]
+        entries = list(recipe._iter_entries(
+            classified, [path for paths in extra_paths.values() for path in paths]
+        ))
+        return _PartState(classified, extra_paths, entries)
+
+    def _load(self):
+        """Reads installed parts and watches their directories."""
+        self._recipes = get_sync_recipes(
+            self.buildout_dir, self.installed_path, self.part_names
+        )
+        self._states.clear()
+        self._watch(BUILDOUT, str(self.installed_path.parent))
+        for recipe in self._recipes:
+            buildout_cfg = recipe.buildout['buildout']
+            self._watch(BUILDOUT, buildout_cfg['directory'])
+            self._watch(BIN, buildout_cfg['bin-directory'])
+            self._watch(DEVELOP_EGGS, buildout_cfg['develop-eggs-directory'])
+            self._watch(EGGS, buildout_cfg['eggs-directory'])
+            for path in recipe._get_extra_paths():
+                for dir_path in _get_watched_dirs(path):
+                    self._watch(EXTRA, dir_path)
+
+    def _watch(self, kind: str, path: str):
+        path = os.path.normpath(path)
+        if kind == EXTRA:
+            # The directory could be already watched with other kind
+            self._extra_dirs.add(path)
+        if any(p == path for _, p in self._watches.values()):
+            return
+        wd = self._inotify.add_watch(path)
+        if wd is not None:
+            self._watches[wd] = (kind, path)
+            self.logger.debug(f'Watching {path}')
+
+    def _wait_changes(self, stop: threading.Event) -> Dict[str, Set[str]]:
+        """Waits for the first relevant event and then collects events
+        until nothing happens during the debounce interval.
+        Returns details of changes by kinds of changed directories -
+        changed directories for extra paths and changed names
+        for other kinds.
+        """
+        changes = {}
+        while not stop.is_set():
+            timeout = self.debounce if changes else 0.5
+            events = self._inotify.read(timeout)
+            if not events:
+                if changes:
+                    break
+                continue
+            for kind, detail in self._iter_changes(events):
+                changes.setdefault(kind, set()).add(detail)
+        return changes
+
+    def _iter_changes(self, events: List[InotifyEvent]) -> Iterator[Tuple[str, str]]:
+        installed_name = self.installed_path.name
+        for event in events:
+            if event.mask & IN_Q_OVERFLOW:
+                # Some events have lost
+                yield BIN, ''
+                yield installed_name, ''
+                continue
+            watch = self._watches.get(event.wd)
+            if watch is None:
+                continue
+            kind, path = watch
+            if path in self._extra_dirs:
+                yield EXTRA, path
+            if event.mask & IN_IGNORED:
+                # The directory has removed
+                del self._watches[event.wd]
+                if kind != EXTRA:
+                    yield kind, ''
+            elif kind == BUILDOUT:
+                if event.name == installed_name:
+                    yield installed_name, event.name
+                elif event.name.endswith('.cfg'):
+                    yield BUILDOUT, event.name
+            elif kind != EXTRA:
+                yield kind, event.name
+
+    def _apply_changes(self, changes: Dict[str, Set[str]]):
+        self.logger.debug(f'Changed: {", ".join(sorted(changes))}')
+        if self.installed_path.name in changes:
+            self.logger.info('Installed parts have changed, reloading.')
+            try:
+                self._load()
+            except UserError as e:
+                self.logger.warning(str(e))
+            return
+        if BUILDOUT in changes:
+            self.logger.warning(
+                'Configuration of buildout has changed. Run buildout '
+                'to apply changes of requirements.'
+            )
+        if BIN in changes:
+            for recipe in self._recipes:
+                recipe.reset_working_set()
+        if EXTRA in changes or BIN in changes:
+            # Directories of globs could be created
+            for recipe in self._recipes:
+                for path in recipe._get_extra_paths():
+                    for dir_path in _get_watched_dirs(path):
+                        self._watch(EXTRA, dir_path)
+
+
+def _get_watched_dirs(path: str) -> List[str]:
+    """Returns directories whose changes affect expanding of the extra path."""
+    if not glob.has_magic(path):
+        return [os.path.dirname(path)]
+    # The last directory without wildcards and directories
+    # matched with the pattern of parent of the last part.
+    head = path
+    while glob.has_magic(head):
+        head = os.path.dirname(head)
+    parent_pattern = os.path.dirname(path)
+    dirs = [head]
+    if parent_pattern != head:
+        dirs.extend(sorted(glob.glob(parent_pattern)))
+    return dirs
+
+
+def watch(buildout_dir: Path, installed_path=None,
+          part_names: Sequence[str] = (),
+          debounce: float = DEFAULT_DEBOUNCE,
+          stop: threading.Event = None):
+    Watcher(buildout_dir, installed_path, part_names, debounce).run(stop)
+
@@ -62,6 +62,7 @@ setup(
         ],
         'console_scripts': [
             'recipe_tests = cykooz.recipe.idea.runtests:runtests [test]',
+            'idea_sync = cykooz.recipe.idea.sync:main',
         ]
     }
 )